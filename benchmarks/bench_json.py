@@ -0,0 +1,72 @@
+"""
+Décodage et encodage JSON d'une liste d'utilisateurs Keycloak : json (stdlib)
+comparé à orjson et, pour le décodage au fil de l'eau, à ijson ; les
+bibliothèques absentes sont ignorées.
+
+    python -m benchmarks.bench_json --users 10000 50000
+"""
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+from .keycloak_stub import Realm
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def decoders():
+    yield "json", json.loads
+    if orjson:
+        yield "orjson", orjson.loads
+    if ijson:
+        yield "ijson (flux)", lambda raw: sum(1 for _ in ijson.items(io.BytesIO(raw), "item", use_float=True))
+
+
+def encoders():
+    yield "json", json.dumps
+    if orjson:
+        yield "orjson", orjson.dumps
+
+
+def measure(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'size':>8} {'':<8} {'library':<14} {'time':>10} {'peak':>10}")
+    for size in args.users:
+        users = Realm("bench", size, 0).users
+        raw = json.dumps(users).encode()
+        for name, func in decoders():
+            elapsed, peak = measure(func, raw, args.repeat)
+            print(f"{size:>8} {len(raw) / 2**20:>6.1f}MB {'decode':<8} {name:<14} {elapsed * 1000:>8.1f}ms {peak / 2**20:>8.1f}MB")
+        for name, func in encoders():
+            elapsed, peak = measure(func, users, args.repeat)
+            print(f"{size:>8} {len(raw) / 2**20:>6.1f}MB {'encode':<8} {name:<14} {elapsed * 1000:>8.1f}ms {peak / 2**20:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Pic mémoire (tracemalloc) de la jointure de realm-users-groups-aggregated :
+l'ancienne jointure (représentations complètes, liste de sortie) comparée à
+la jointure compacte (passerelle_imio_keycloak.aggregation) dont la sortie
+est sérialisée au fil de l'eau. Les utilisateurs arrivent par pages JSON
+décodées, comme depuis Keycloak.
+
+    python -m benchmarks.bench_memory --users 10000 50000 100000 --groups 200
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from passerelle_imio_keycloak import aggregation
+from passerelle_imio_keycloak.groups import GroupTree
+
+from .keycloak_stub import Realm
+
+FIELDS = ["id", "username", "firstName", "lastName", "email", "enabled", "groups"]
+
+
+def pages(users, size=500):
+    for first in range(0, len(users), size):
+        yield from json.loads(json.dumps(users[first:first + size]))
+
+
+def legacy_join(realm, members):
+    users = list(pages(realm.users))
+    users_by_id = {u.get("id"): u for u in users if u.get("id")}
+    user_groups = {}
+    for g in realm.groups:
+        group_info = {"id": g["id"], "name": g.get("name")}
+        for guid in members.get(g["id"], []):
+            if guid in users_by_id:
+                user_groups.setdefault(guid, []).append(group_info)
+    data = []
+    for guid, u in users_by_id.items():
+        data.append({
+            "id": guid,
+            "username": u.get("username"),
+            "firstName": u.get("firstName"),
+            "lastName": u.get("lastName"),
+            "email": u.get("email"),
+            "enabled": u.get("enabled"),
+            "groups": user_groups.get(guid, []),
+        })
+    return sum(len(json.dumps(user)) for user in data)
+
+
+def compact_join(realm, members):
+    tree = GroupTree(json.loads(json.dumps(realm.groups)))
+    records = aggregation.compact_users(pages(realm.users), FIELDS)
+    tree.set_members(members)
+    del members
+    return sum(len(json.dumps(user)) for user in aggregation.iter_aggregated(records, FIELDS, tree))
+
+
+def measure(join, realm):
+    members = json.loads(json.dumps({gid: [u["id"] for u in users] for gid, users in realm.members.items()}))
+    tracemalloc.start()
+    start = time.perf_counter()
+    output = join(realm, members)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return output, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--memberships", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'output':>10} {'legacy peak':>12} {'compact peak':>13} {'ratio':>6}")
+    for size in args.users:
+        realm = Realm("bench", size, args.groups, args.memberships)
+        output, legacy_peak, _ = measure(legacy_join, realm)
+        _, compact_peak, _ = measure(compact_join, realm)
+        print(
+            f"{size:>8} {output / 2**20:>8.1f}MB {legacy_peak / 2**20:>10.1f}MB {compact_peak / 2**20:>11.1f}MB"
+            f" {legacy_peak / compact_peak:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
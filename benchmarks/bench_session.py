@@ -0,0 +1,59 @@
+"""
+Compare des appels requests.get() successifs (une connexion par appel) avec
+une session keep-alive à pool de connexions, contre le bouchon Keycloak.
+
+    python -m benchmarks.bench_session --calls 500 --workers 8
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .keycloak_stub import Realm, start_server
+
+
+def run(label, get, urls, workers):
+    latencies = []
+
+    def call(url):
+        start = time.perf_counter()
+        get(url).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(call, urls))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{label:<10} {len(urls) / elapsed:8.0f} req/s"
+        f"  p50 {statistics.median(latencies) * 1000:6.2f} ms"
+        f"  p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--groups", type=int, default=100)
+    args = parser.parse_args()
+
+    realm = Realm("imio", users=1000, groups=args.groups)
+    server = start_server([realm])
+    base = f"http://127.0.0.1:{server.server_port}/admin/realms/imio"
+    urls = [f"{base}/groups/{realm.groups[i % len(realm.groups)]['id']}/members" for i in range(args.calls)]
+
+    run("requests", requests.get, urls, args.workers)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=args.workers, pool_maxsize=args.workers)
+    session.mount("http://", adapter)
+    run("session", session.get, urls, args.workers)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
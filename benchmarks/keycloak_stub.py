@@ -0,0 +1,226 @@
+"""
+Bouchon de l'API d'administration Keycloak, utilisé par les benchmarks.
+
+Les realms sont générés de manière déterministe (graine) à la taille voulue ;
+une latence (fixe + aléatoire) peut être injectée sur chaque appel. Les appels
+en écriture répondent comme Keycloak mais ne modifient pas les données.
+
+    python -m benchmarks.keycloak_stub --port 8081 --users 10000 --groups 200 --latency 0.005
+"""
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class Realm:
+    def __init__(self, name, users=1000, groups=10, memberships=2, seed=0):
+        rnd = random.Random(seed)
+        self.name = name
+        self.users = [
+            {
+                "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+                "username": f"user{i}@{name}.be",
+                "firstName": f"Prénom{i}",
+                "lastName": f"Nom{i}",
+                "email": f"user{i}@{name}.be",
+                "enabled": i % 10 != 0,
+                "emailVerified": True,
+                "createdTimestamp": 1700000000000 + i,
+            }
+            for i in range(users)
+        ]
+        self.users_by_id = {user["id"]: user for user in self.users}
+        self.groups = [
+            {"id": str(uuid.UUID(int=rnd.getrandbits(128))), "name": f"groupe-{i}", "path": f"/groupe-{i}", "subGroups": []}
+            for i in range(groups)
+        ]
+        self.groups_by_id = {group["id"]: group for group in self.groups}
+        self.members = {group["id"]: [] for group in self.groups}
+        self.user_groups = {user["id"]: [] for user in self.users}
+        for user in self.users:
+            for group in rnd.sample(self.groups, min(memberships, len(self.groups))):
+                self.members[group["id"]].append(user)
+                self.user_groups[user["id"]].append(group)
+
+    def credentials(self, user_id):
+        index = int(user_id[:8], 16)
+        credentials = [{"id": f"{user_id[:24]}00000000000a", "type": "password", "createdDate": 1700000000000}]
+        if index % 3 == 0:
+            credentials.append({"id": f"{user_id[:24]}00000000000b", "type": "otp", "createdDate": 1700000000000})
+        return credentials
+
+    def federated_identities(self, user_id):
+        user = self.users_by_id[user_id]
+        if int(user_id[:8], 16) % 2:
+            return []
+        return [{"identityProvider": "imio", "userId": user_id, "userName": user["username"]}]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status=204, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def not_found(self):
+        self.send_json({"error": "not found"}, status=404)
+
+    def wait(self):
+        self.server.calls += 1
+        time.sleep(self.server.latency + random.random() * self.server.jitter)
+
+    def paginate(self, items, query, default=100):
+        first = int(query.get("first", ["0"])[0])
+        size = int(query.get("max", [str(default)])[0])
+        return items[first:first + size]
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length)
+
+    def route(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/admin/realms":
+            return None, "realms", query
+        match = re.match(r"^/admin/realms/(?P<realm>[^/]+)(?:/(?P<rest>.*))?$", url.path)
+        realm = match and self.server.realms.get(match.group("realm"))
+        return realm, unquote(match.group("rest") or "") if match else None, query
+
+    def do_POST(self):
+        self.read_body()
+        self.wait()
+        if self.path.endswith("/protocol/openid-connect/token"):
+            return self.send_json({
+                "access_token": uuid.uuid4().hex,
+                "expires_in": 60,
+                "refresh_token": uuid.uuid4().hex,
+                "refresh_expires_in": 1800,
+            })
+        realm, rest, query = self.route()
+        if not realm:
+            return self.not_found()
+        if rest == "users":
+            location = f"http://{self.headers.get('Host')}/admin/realms/{realm.name}/users/{uuid.uuid4()}"
+            return self.send_empty(201, {"Location": location})
+        if re.match(r"^users/[^/]+/federated-identity/[^/]+$", rest):
+            return self.send_empty(204)
+        return self.not_found()
+
+    def do_PUT(self):
+        self.read_body()
+        self.wait()
+        realm, rest, query = self.route()
+        if realm and re.match(r"^users/[^/]+(/groups/[^/]+)?$", rest):
+            return self.send_empty(204)
+        return self.not_found()
+
+    def do_DELETE(self):
+        self.wait()
+        realm, rest, query = self.route()
+        if realm and re.match(r"^users/[^/]+(/groups/[^/]+|/credentials/[^/]+|/federated-identity/[^/]+)?$", rest):
+            return self.send_empty(204)
+        return self.not_found()
+
+    def do_GET(self):
+        self.wait()
+        realm, rest, query = self.route()
+        if rest == "realms":
+            return self.send_json([{"id": name, "realm": name} for name in self.server.realms])
+        if not realm:
+            return self.not_found()
+        if rest == "users":
+            users = realm.users
+            if "email" in query:
+                email = query["email"][0].lower()
+                users = [u for u in users if email in u["email"]]
+            if "search" in query:
+                search = query["search"][0].lower()
+                users = [u for u in users if search in u["username"] or search in u["email"]]
+            return self.send_json(self.paginate(users, query))
+        if rest == "users/count":
+            return self.send_json(len(realm.users))
+        if rest == "groups":
+            return self.send_json(self.paginate(realm.groups, query, default=len(realm.groups)))
+        if rest == "groups/count":
+            return self.send_json({"count": len(realm.groups)})
+        if rest == "admin-events":
+            return self.send_json([])
+        if rest == "events/config":
+            return self.send_json({"adminEventsEnabled": True, "eventsEnabled": False})
+        match = re.match(r"^users/(?P<id>[^/]+)(?:/(?P<sub>groups|credentials|federated-identity))?$", rest)
+        if match and match.group("id") in realm.users_by_id:
+            user_id, sub = match.group("id"), match.group("sub")
+            if sub == "groups":
+                return self.send_json(realm.user_groups[user_id])
+            if sub == "credentials":
+                return self.send_json(realm.credentials(user_id))
+            if sub == "federated-identity":
+                return self.send_json(realm.federated_identities(user_id))
+            return self.send_json(realm.users_by_id[user_id])
+        match = re.match(r"^groups/(?P<id>[^/]+)(?:/(?P<sub>members|children))?$", rest)
+        if match and match.group("id") in realm.groups_by_id:
+            group_id, sub = match.group("id"), match.group("sub")
+            if sub == "members":
+                return self.send_json(self.paginate(realm.members[group_id], query))
+            if sub == "children":
+                return self.send_json([])
+            return self.send_json(realm.groups_by_id[group_id])
+        return self.not_found()
+
+
+def start_server(realms, port=0, latency=0.0, jitter=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.realms = {realm.name: realm for realm in realms}
+    server.latency = latency
+    server.jitter = jitter
+    server.calls = 0
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--realm", default="imio")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--memberships", type=int, default=2, help="nombre de groupes par utilisateur")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence injectée (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latence aléatoire supplémentaire (secondes)")
+    args = parser.parse_args()
+    realm = Realm(args.realm, args.users, args.groups, args.memberships)
+    server = start_server([realm], args.port, args.latency, args.jitter)
+    print(f"Keycloak stub on http://127.0.0.1:{server.server_port}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
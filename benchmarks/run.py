@@ -0,0 +1,226 @@
+"""
+Benchmark des endpoints de KeycloakConnector contre le bouchon Keycloak.
+
+Mesure pour chaque endpoint le débit, les latences p50/p99, le nombre
+d'appels à Keycloak et le pic mémoire (tracemalloc) ; compare le résultat à
+une référence enregistrée et sort en erreur en cas de régression.
+
+Nécessite un environnement passerelle dont les settings incluent
+passerelle_imio_keycloak (une base de test est créée puis supprimée) :
+
+    DJANGO_SETTINGS_MODULE=passerelle.settings python -m benchmarks.run --users 10000 --groups 200
+    python -m benchmarks.run --users 10000 --groups 200 --save-baseline
+    python -m benchmarks.run --only realm-users-groups-aggregated --iterations 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from .keycloak_stub import Realm, start_server
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+REALM = "bench"
+# realms supplémentaires, pour realms-users-groups-aggregated
+OTHER_REALMS = ["bench2", "bench3"]
+
+
+def scenarios(realm):
+    user = realm.users[len(realm.users) // 2]
+    group = realm.groups[0]
+    return [
+        # (nom, méthode, paramètres, corps POST)
+        ("get-bearer-token", "access_token", {}, None),
+        ("read-users", "get_users", {"realm": REALM}, None),
+        ("read-users-page", "get_users", {"realm": REALM, "first": "0", "max": "100"}, None),
+        ("read-users-search", "get_users", {"realm": REALM, "q": "user1"}, None),
+        ("read-user-groups", "get_user_groups", {"realm": REALM, "user_id": user["id"]}, None),
+        ("read-user-credentials", "get_user_credentials", {"realm": REALM, "user_id": user["id"]}, None),
+        ("delete-user-credential", "delete_user_credential",
+            {"realm": REALM, "user_id": user["id"], "credential_id": realm.credentials(user["id"])[0]["id"]}, None),
+        ("update-user", "update_user", {"realm": REALM, "user_id": user["id"]}, {"firstName": "Stephen"}),
+        ("create-user", "create_user", {"realm": REALM}, {"username": "drstranger@marvel.com", "enabled": True}),
+        ("read-user-by-mail", "get_user_by_mail", {"realm": REALM, "email": user["email"]}, None),
+        ("read-groups", "get_groups", {"realm": REALM}, None),
+        ("users-datasource", "users_datasource", {"realm": REALM, "q": "user12"}, None),
+        ("users-datasource-id", "users_datasource", {"realm": REALM, "id": user["id"]}, None),
+        ("groups-datasource", "groups_datasource", {"realm": REALM, "q": "groupe-1"}, None),
+        ("delete-user", "delete_user", {"realm": REALM, "user_id": user["id"]}, None),
+        ("create-idp-link", "create_idp_link", {"realm": REALM, "user_id": user["id"], "provider_id": "imio"},
+            {"identityProvider": "imio", "userId": user["id"], "userName": user["username"]}),
+        ("get-idp-link", "read_idp_links", {"realm": REALM, "user_id": user["id"]}, None),
+        ("delete-idp-link", "delete_idp_link", {"realm": REALM, "user_id": user["id"], "provider_id": "imio"}, None),
+        ("read-user-group", "read_user_group", {"realm": REALM, "user_id": user["id"]}, None),
+        ("add-user-group", "add_user_group", {"realm": REALM, "user_id": user["id"], "group_id": group["id"]}, None),
+        ("delete-user-group", "delete_user_group",
+            {"realm": REALM, "user_id": user["id"], "group_id": group["id"]}, None),
+        ("bulk-users", "bulk_users", {"realm": REALM},
+            [{"op": "update", "user_id": u["id"], "data": {"enabled": True}} for u in realm.users[:100]]),
+        ("read-users-details", "read_users_details",
+            {"realm": REALM, "user_ids": ",".join(u["id"] for u in realm.users[:50])}, None),
+        ("bulk-credentials-cleanup", "bulk_credentials_cleanup",
+            {"realm": REALM, "credential_type": "otp", "dry_run": "false"}, []),
+        ("read-groups-members", "read_groups_members", {"realm": REALM, "group_id": group["id"]}, None),
+        ("sync-group-members", "sync_group_members", {"realm": REALM, "group_id": group["id"], "dry_run": "true"},
+            [u["id"] for u in realm.users[:100]]),
+        ("realm-users-groups-aggregated", "realm_users_groups_aggregated", {"realm": REALM}, None),
+        ("realms-users-groups-aggregated", "realms_users_groups_aggregated",
+            {"realms": ",".join([REALM] + OTHER_REALMS)}, None),
+    ]
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "passerelle.settings")
+    import django
+
+    django.setup()
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    return runner, runner.setup_databases()
+
+
+def consume(response):
+    # sérialisation comprise, comme le ferait passerelle
+    if hasattr(response, "streaming_content"):
+        return sum(len(chunk) for chunk in response.streaming_content)
+    if hasattr(response, "content"):
+        return len(response.content)
+    return len(json.dumps(response))
+
+
+def call(connector, factory, method, params, body):
+    if body is None:
+        request = factory.get("/", params)
+    else:
+        request = factory.post("/", data=json.dumps(body), content_type="application/json")
+    return consume(getattr(connector, method)(request, **params))
+
+
+def measure(connector, factory, server, scenario, iterations, concurrency=1):
+    from django.core.cache import cache
+
+    name, method, params, body = scenario
+    cache.clear()
+    call(connector, factory, method, params, body)  # préchauffage (token, connexions)
+    calls = server.calls
+    latencies = []
+
+    def timed_call(_):
+        t = time.perf_counter()
+        call(connector, factory, method, params, body)
+        latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    # appels simultanés : cellules d'une même page combo
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_call, range(iterations)))
+    elapsed = time.perf_counter() - start
+    upstream_calls = (server.calls - calls) / iterations
+
+    tracemalloc.start()
+    call(connector, factory, method, params, body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "throughput": round(iterations / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 2),
+        "upstream_calls": round(upstream_calls, 1),
+        "peak_memory_kb": peak // 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_memory_kb", "upstream_calls"):
+            if result[metric] > reference[metric] * (1 + tolerance) and result[metric] - reference[metric] > 1:
+                regressions.append(f"{name}: {metric} {reference[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--memberships", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.002, help="latence injectée par appel (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help="appels simultanés du même endpoint")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="cache_ttl du connecteur (0 : sans cache)")
+    parser.add_argument("--only", action="append", help="limiter à cet endpoint (répétable)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="écart toléré par rapport à la référence")
+    args = parser.parse_args()
+
+    runner, old_config = setup_django()
+    try:
+        from django.test import RequestFactory
+
+        from passerelle_imio_keycloak.models import KeycloakConnector
+
+        realm = Realm(REALM, args.users, args.groups, args.memberships)
+        others = [Realm(name, args.users, args.groups, args.memberships, seed=i) for i, name in enumerate(OTHER_REALMS, 1)]
+        server = start_server([realm] + others, latency=args.latency, jitter=args.jitter)
+        connector = KeycloakConnector.objects.create(
+            slug="bench",
+            title="bench",
+            description="bench",
+            url=f"http://127.0.0.1:{server.server_port}/",
+            username="admin",
+            password="admin",
+            client_id="admin-cli",
+            cache_ttl=args.cache_ttl,
+        )
+        factory = RequestFactory()
+
+        results = {}
+        for scenario in scenarios(realm):
+            if args.only and scenario[0] not in args.only:
+                continue
+            results[scenario[0]] = result = measure(
+                connector, factory, server, scenario, args.iterations, args.concurrency
+            )
+            print(
+                f"{scenario[0]:<32} {result['throughput']:>9.1f} op/s  p50 {result['p50_ms']:>9.2f} ms"
+                f"  p99 {result['p99_ms']:>9.2f} ms  {result['upstream_calls']:>7.1f} calls"
+                f"  {result['peak_memory_kb']:>8} KiB"
+            )
+        server.shutdown()
+    finally:
+        runner.teardown_databases(old_config)
+
+    key = f"{args.users}u-{args.groups}g-{args.memberships}m-cache{args.cache_ttl}"
+    if args.concurrency > 1:
+        key += f"-c{args.concurrency}"
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as fd:
+            baselines = json.load(fd)
+    if args.save_baseline:
+        baselines.setdefault(key, {}).update(results)
+        with open(BASELINES, "w") as fd:
+            json.dump(baselines, fd, indent=2, sort_keys=True)
+        print(f"baseline {key} saved")
+        return
+    regressions = compare(results, baselines.get(key, {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
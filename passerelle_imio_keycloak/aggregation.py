@@ -0,0 +1,78 @@
+"""
+Jointure utilisateurs / groupes de realm-users-groups-aggregated.
+
+Pour limiter la mémoire sur les gros realms, chaque utilisateur retenu est
+réduit à un tuple des seuls champs demandés (les représentations Keycloak
+complètes ne sont pas conservées), les GUID sont internés et les groupes
+sont partagés entre utilisateurs ; la sortie est produite par un générateur,
+un utilisateur à la fois.
+"""
+import hashlib
+import sys
+
+from . import fastjson
+
+
+def compact_users(users, fields, predicate=None):
+    """
+    {GUID: (valeur, ...)} pour les champs demandés (hors "groups"), dans l'ordre
+    de users ; users peut être un itérateur, seul un utilisateur complet est
+    alors en mémoire à la fois.
+    """
+    value_fields = [field for field in fields if field != "groups"]
+    records = {}
+    for user in users:
+        guid = user.get("id")
+        if not guid or (predicate and not predicate(user)):
+            continue
+        records[sys.intern(guid)] = tuple(user.get(field) for field in value_fields)
+    return records
+
+
+def group_references(tree):
+    """Une seule représentation de chaque groupe, partagée par ses membres."""
+    return {g["id"]: {"id": g["id"], "name": g.get("name"), "path": g.get("path")} for g in tree}
+
+
+def iter_aggregated(records, fields, tree=None, inherited=False, progress=None):
+    group_infos = group_references(tree) if "groups" in fields else None
+    for count, (guid, values) in enumerate(records.items(), 1):
+        values = iter(values)
+        user = {}
+        for field in fields:
+            if field == "groups":
+                user[field] = [group_infos[group_id] for group_id in tree.groups_of(guid, inherited)]
+            else:
+                user[field] = next(values)
+        if progress and count % 1000 == 0:
+            progress(users=count)
+        yield user
+
+
+def user_digest(user):
+    """Empreinte d'un utilisateur agrégé, groupes compris."""
+    return hashlib.blake2b(fastjson.dumps(user).encode(), digest_size=8).hexdigest()
+
+
+def version(params_key, digests):
+    """Version d'une réponse : empreinte des filtres et des empreintes des utilisateurs."""
+    h = hashlib.blake2b(params_key.encode(), digest_size=12)
+    for user_id in sorted(digests):
+        h.update(f"{user_id}:{digests[user_id]};".encode())
+    return h.hexdigest()
+
+
+def delta(previous, digests, users):
+    """
+    Utilisateurs ajoutés et modifiés (parmi users, les utilisateurs
+    courants) et GUID des utilisateurs supprimés depuis previous.
+    """
+    added, changed = [], []
+    for user in users:
+        old = previous.get(user["id"])
+        if old is None:
+            added.append(user)
+        elif old != digests[user["id"]]:
+            changed.append(user)
+    removed = [user_id for user_id in previous if user_id not in digests]
+    return {"added": added, "changed": changed, "removed": removed}
@@ -0,0 +1,126 @@
+"""
+Protections des appels à Keycloak, partagées entre les processus via le
+cache Django : disjoncteur (circuit breaker) et limite de débit.
+"""
+import time
+
+import requests
+from django.core.cache import cache
+
+
+class UpstreamUnavailable(requests.ConnectionError):
+    """Appel refusé sans contacter Keycloak (disjoncteur ouvert, débit ou concurrence dépassés)."""
+
+
+def _incr(key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # clé expirée entre add et incr
+        cache.set(key, 1, timeout)
+        return 1
+
+
+class CircuitBreaker:
+    """
+    Les appels sont comptés par fenêtre de window secondes ; à partir de
+    min_calls appels, si la proportion d'échecs (erreur réseau, réponse 5xx
+    ou plus lente que slow_call secondes) atteint failure_ratio, le
+    disjoncteur s'ouvre pendant open_seconds et les appels échouent
+    immédiatement. Un seul appel d'essai est ensuite autorisé (semi-ouvert) :
+    son succès referme le disjoncteur, son échec le rouvre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, prefix, window=30, min_calls=20, failure_ratio=0.5, slow_call=10, open_seconds=30):
+        self.prefix = prefix
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+
+    def _window_keys(self):
+        window = int(time.time() // self.window)
+        return f"{self.prefix}-calls-{window}", f"{self.prefix}-failures-{window}"
+
+    def state(self):
+        values = cache.get_many([f"{self.prefix}-open", f"{self.prefix}-tripped"])
+        if values.get(f"{self.prefix}-open"):
+            return self.OPEN
+        if values.get(f"{self.prefix}-tripped"):
+            return self.HALF_OPEN
+        return self.CLOSED
+
+    def counters(self):
+        calls_key, failures_key = self._window_keys()
+        values = cache.get_many([calls_key, failures_key])
+        return values.get(calls_key, 0), values.get(failures_key, 0)
+
+    def error_ratio(self):
+        calls, failures = self.counters()
+        return failures / calls if calls >= self.min_calls else 0
+
+    def before_call(self):
+        """
+        Lève UpstreamUnavailable si l'appel n'est pas autorisé ; retourne
+        True s'il s'agit de l'appel d'essai du disjoncteur semi-ouvert.
+        """
+        state = self.state()
+        if state == self.OPEN:
+            raise UpstreamUnavailable("Keycloak indisponible (disjoncteur ouvert)")
+        if state == self.HALF_OPEN:
+            if not cache.add(f"{self.prefix}-probe", True, self.open_seconds):
+                raise UpstreamUnavailable("Keycloak indisponible (disjoncteur semi-ouvert, essai en cours)")
+            return True
+        return False
+
+    def after_call(self, failed, probe=False):
+        if probe:
+            cache.delete(f"{self.prefix}-probe")
+            if failed:
+                self.trip()
+            else:
+                cache.delete(f"{self.prefix}-tripped")
+            return
+        calls_key, failures_key = self._window_keys()
+        calls = _incr(calls_key, self.window * 2)
+        if failed:
+            failures = _incr(failures_key, self.window * 2)
+            if calls >= self.min_calls and failures >= calls * self.failure_ratio:
+                self.trip()
+
+    def trip(self):
+        cache.set(f"{self.prefix}-open", time.time(), self.open_seconds)
+        # sans appel d'essai pendant ce délai, le disjoncteur se referme de lui-même
+        cache.set(f"{self.prefix}-tripped", True, self.open_seconds * 10)
+
+
+class RateLimiter:
+    """
+    Au plus rate appels par seconde, tous processus confondus : un seau de
+    rate jetons, rempli chaque seconde (compteur dans le cache). Le débit
+    autorisé est réduit en proportion du taux d'échec récent des appels.
+    """
+
+    def __init__(self, prefix, rate):
+        self.prefix = prefix
+        self.rate = rate
+
+    def acquire(self, timeout, error_ratio=0):
+        if not self.rate:
+            return
+        rate = max(int(self.rate * (1 - error_ratio)), 1)
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            if _incr(f"{self.prefix}-rate-{int(now)}", 2) <= rate:
+                return
+            wait = 1 - now % 1
+            if time.monotonic() + wait > deadline:
+                raise UpstreamUnavailable("Keycloak indisponible (limite de débit atteinte)")
+            time.sleep(wait)
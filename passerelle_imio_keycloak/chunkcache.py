@@ -0,0 +1,69 @@
+"""
+Valeurs volumineuses (snapshots d'un realm) dans le cache Django : memcached
+refuse les éléments de plus de 1 Mo, la valeur est donc compressée et
+découpée en morceaux de taille bornée, retrouvés grâce à une entête.
+"""
+import logging
+import uuid
+import zlib
+
+from django.core.cache import cache
+
+from . import fastjson
+
+CHUNK_SIZE = 512 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_keys(key, head):
+    return [f"{key}-{head['token']}-{i}" for i in range(head["chunks"])]
+
+
+def set_value(key, value, timeout, **meta):
+    """
+    Stocke value (sérialisable en JSON) ; meta est conservé dans l'entête,
+    lisible sans charger la valeur. Retourne False si le cache a refusé la
+    valeur, auquel cas la valeur précédente est aussi retirée.
+    """
+    raw = zlib.compress(fastjson.dumps(value).encode(), 1)
+    head = dict(meta, token=uuid.uuid4().hex, chunks=max((len(raw) + CHUNK_SIZE - 1) // CHUNK_SIZE, 1))
+    chunks = {
+        chunk_key: raw[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE] for i, chunk_key in enumerate(_chunk_keys(key, head))
+    }
+    try:
+        # les morceaux d'abord : l'entête ne désigne jamais une valeur incomplète
+        failed = cache.set_many(chunks, timeout)
+        if not failed:
+            cache.set(key, head, timeout)
+            return True
+        logger.warning("keycloak: cache refused %d chunks of %s (%d bytes)", len(failed), key, len(raw))
+    except Exception as e:  # erreurs propres au backend (pymemcache, redis...)
+        logger.warning("keycloak: cannot cache %s (%d bytes): %s", key, len(raw), e)
+    try:
+        cache.delete(key)
+    except Exception:
+        pass
+    return False
+
+
+def get_head(key):
+    """Entête (meta) de la valeur, ou None si elle est absente du cache."""
+    head = cache.get(key)
+    # entête d'un autre format (antérieur au découpage)
+    if not isinstance(head, dict) or "token" not in head:
+        return None
+    return head
+
+
+def get_value(key, head=None):
+    """Valeur désignée par l'entête, None si absente ou incomplète."""
+    head = head or get_head(key)
+    if head is None:
+        return None
+    keys = _chunk_keys(key, head)
+    chunks = cache.get_many(keys)
+    if len(chunks) < len(keys):
+        # morceau expiré ou évincé
+        return None
+    return fastjson.loads(zlib.decompress(b"".join(chunks[chunk_key] for chunk_key in keys)))
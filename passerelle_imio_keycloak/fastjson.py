@@ -0,0 +1,38 @@
+"""
+Encodage et décodage JSON : orjson s'il est installé (plusieurs fois plus
+rapide sur les grandes listes d'utilisateurs), json sinon ; les listes
+volumineuses peuvent être décodées au fil de l'eau avec ijson.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def loads(data):
+    """data : str ou bytes"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def iter_items(fd):
+    """
+    Éléments d'une liste JSON lus depuis un fichier sans le charger
+    entièrement ; nécessite ijson.
+    """
+    # nombres décimaux en float, comme json.loads
+    return ijson.items(fd, "item", use_float=True)
@@ -0,0 +1,100 @@
+import sys
+
+from .utils import normalize_search
+
+
+class GroupTree:
+    """
+    Arborescence des groupes d'un realm, indexée par GUID et par chemin.
+
+    Les sous-groupes absents de la représentation (Keycloak >= 23 ne renvoie
+    que subGroupCount) sont récupérés niveau par niveau, en parallèle, via
+    fetch_children. Une fois les membres directs chargés (set_members), les
+    groupes d'un utilisateur sont obtenus en temps constant ; les groupes
+    hérités le sont aussi après leur premier calcul.
+    """
+
+    def __init__(self, groups, fetch_children=None, parallel_map=map):
+        self.roots = groups
+        self.by_id = {}
+        self.by_path = {}
+        self.parent = {}
+        self.ancestors = {}
+        self.direct_groups = {}
+        self.effective_groups = {}
+        self.search_index = None
+        self._build(fetch_children, parallel_map)
+
+    def _build(self, fetch_children, parallel_map):
+        level = [(None, g) for g in self.roots]
+        while level:
+            to_fetch = []
+            for parent_id, g in level:
+                group_id = g.get("id")
+                if not group_id or group_id in self.by_id:
+                    continue
+                parent_path = self.by_id[parent_id]["path"] if parent_id else ""
+                g.setdefault("path", f"{parent_path}/{g.get('name')}")
+                self.by_id[group_id] = g
+                self.by_path[g["path"]] = g
+                self.parent[group_id] = parent_id
+                self.ancestors[group_id] = (self.ancestors[parent_id] + (parent_id,)) if parent_id else ()
+                if not g.get("subGroups") and g.get("subGroupCount") and fetch_children:
+                    to_fetch.append(g)
+            for g, children in zip(to_fetch, parallel_map(lambda g: fetch_children(g["id"]), to_fetch)):
+                g["subGroups"] = children
+            level = [(g["id"], child) for _, g in level if g.get("id") for child in g.get("subGroups") or []]
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, group):
+        """Groupe désigné par son GUID ou son chemin."""
+        return self.by_id.get(group) or self.by_path.get(group)
+
+    def subtree(self, group):
+        """Le groupe suivi de tous ses descendants."""
+        root = self.get(group)
+        if not root:
+            return []
+        return [g for g in self if g["id"] == root["id"] or root["id"] in self.ancestors[g["id"]]]
+
+    def search(self, text):
+        """
+        Groupes dont le chemin contient tous les mots de text (sans tenir
+        compte des accents ni de la casse), triés par chemin.
+        """
+        if self.search_index is None:
+            # chemins éventuellement identiques (« / » dans un nom de groupe) : les
+            # groupes eux-mêmes ne sont pas comparés
+            self.search_index = sorted(
+                ((normalize_search(g["path"]), g["path"], g) for g in self), key=lambda entry: entry[:2]
+            )
+        words = normalize_search(text).split()
+        return [g for normalized, _, g in self.search_index if all(word in normalized for word in words)]
+
+    def set_members(self, members):
+        """
+        members : {GUID du groupe: [GUID d'utilisateur, ...]} (membres directs)
+        """
+        self.direct_groups = {}
+        self.effective_groups = {}
+        for group_id in self.by_id:
+            for user_id in members.get(group_id, ()):
+                self.direct_groups.setdefault(sys.intern(user_id), []).append(group_id)
+
+    def groups_of(self, user_id, inherited=False):
+        if not inherited:
+            return self.direct_groups.get(user_id, [])
+        # groupes hérités calculés à la première demande puis mémorisés
+        effective = self.effective_groups.get(user_id)
+        if effective is None:
+            group_ids = self.direct_groups.get(user_id, [])
+            effective = dict.fromkeys(group_ids)
+            for group_id in group_ids:
+                effective.update(dict.fromkeys(self.ancestors[group_id]))
+            effective = self.effective_groups[user_id] = list(effective)
+        return effective
@@ -0,0 +1,195 @@
+"""
+Mesures des appels à Keycloak : nombre d'appels, durées, volume reçu, temps
+de décodage JSON et utilisation des caches, par appel d'endpoint (journal)
+et, si prometheus_client est installé, sous forme de compteurs/histogrammes.
+"""
+import contextvars
+import functools
+import inspect
+import re
+import threading
+import time
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+if prometheus_client:
+    UPSTREAM_REQUESTS = prometheus_client.Counter(
+        "passerelle_keycloak_upstream_requests_total",
+        "Appels à l'API Keycloak",
+        ["connector", "method", "path", "status"],
+    )
+    UPSTREAM_SECONDS = prometheus_client.Histogram(
+        "passerelle_keycloak_upstream_request_seconds",
+        "Durée des appels à l'API Keycloak",
+        ["connector", "method", "path"],
+    )
+    UPSTREAM_BYTES = prometheus_client.Counter(
+        "passerelle_keycloak_upstream_received_bytes_total",
+        "Volume reçu de l'API Keycloak",
+        ["connector"],
+    )
+    ENDPOINT_SECONDS = prometheus_client.Histogram(
+        "passerelle_keycloak_endpoint_seconds",
+        "Durée des endpoints du connecteur",
+        ["connector", "endpoint"],
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        "passerelle_keycloak_cache_lookups_total",
+        "Consultations des caches du connecteur",
+        ["connector", "cache", "result"],
+    )
+    UPSTREAM_REJECTED = prometheus_client.Counter(
+        "passerelle_keycloak_upstream_rejected_total",
+        "Appels à Keycloak refusés par le connecteur (disjoncteur, débit, concurrence)",
+        ["connector", "reason"],
+    )
+    STALE_SERVED = prometheus_client.Counter(
+        "passerelle_keycloak_stale_served_total",
+        "Données expirées servies faute de pouvoir joindre Keycloak",
+        ["connector", "cache"],
+    )
+
+_GUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_REALM_RE = re.compile(r"^admin/realms/[^/]+")
+
+
+def path_template(path):
+    """admin/realms/imio/users/<guid>/groups -> admin/realms/{realm}/users/{id}/groups"""
+    return _GUID_RE.sub("{id}", _REALM_RE.sub("admin/realms/{realm}", path))
+
+
+class CallStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.bytes_received = 0
+        self.json_decode_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self):
+        return {
+            "upstream_calls": self.upstream_calls,
+            "upstream_seconds": round(self.upstream_seconds, 4),
+            "bytes_received": self.bytes_received,
+            "json_decode_seconds": round(self.json_decode_seconds, 4),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+current_stats = contextvars.ContextVar("passerelle_imio_keycloak_stats", default=None)
+
+
+def record_upstream(connector, method, path, status, duration, nbytes):
+    stats = current_stats.get()
+    if stats:
+        with stats.lock:
+            stats.upstream_calls += 1
+            stats.upstream_seconds += duration
+            stats.bytes_received += nbytes
+    if prometheus_client:
+        template = path_template(path)
+        UPSTREAM_REQUESTS.labels(connector, method.upper(), template, str(status)).inc()
+        UPSTREAM_SECONDS.labels(connector, method.upper(), template).observe(duration)
+        UPSTREAM_BYTES.labels(connector).inc(nbytes)
+
+
+def record_json_decode(duration):
+    stats = current_stats.get()
+    if stats:
+        with stats.lock:
+            stats.json_decode_seconds += duration
+
+
+def record_cache(connector, name, hit):
+    stats = current_stats.get()
+    if stats:
+        with stats.lock:
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+    if prometheus_client:
+        CACHE_LOOKUPS.labels(connector, name, "hit" if hit else "miss").inc()
+
+
+def record_rejection(connector, reason):
+    """reason : circuit-open, rate-limit ou concurrency"""
+    if prometheus_client:
+        UPSTREAM_REJECTED.labels(connector, reason).inc()
+
+
+def record_stale(connector, name):
+    if prometheus_client:
+        STALE_SERVED.labels(connector, name).inc()
+
+
+def _log_stats(connector, endpoint, stats, duration):
+    if prometheus_client:
+        ENDPOINT_SECONDS.labels(connector.slug, endpoint).observe(duration)
+    connector.logger.debug(
+        "keycloak: %s in %.3fs (%d upstream calls)",
+        endpoint,
+        duration,
+        stats.upstream_calls,
+        extra=dict(stats.as_dict(), endpoint=endpoint, duration=round(duration, 4)),
+    )
+
+
+def _measured_content(connector, endpoint, stats, start, context, content):
+    """
+    Contenu d'une réponse en flux : les appels à Keycloak ont lieu pendant
+    son parcours, qui est mesuré dans le contexte de l'endpoint ; les mesures
+    sont enregistrées à la fin du parcours (ou à son abandon).
+    """
+    iterator = iter(content)
+    try:
+        while True:
+            try:
+                chunk = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            context.run(close)
+        _log_stats(connector, endpoint, stats, time.perf_counter() - start)
+
+
+def instrumented(func):
+    """
+    Mesure un endpoint du connecteur et journalise (niveau debug) le détail
+    des appels à Keycloak effectués pour y répondre, jusqu'à la fin du flux
+    pour les réponses en flux.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        stats = CallStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        streamed = False
+        try:
+            response = func(self, request, *args, **kwargs)
+            # les fichiers (FileResponse) sont servis tels quels, sans appel à Keycloak
+            if getattr(response, "streaming", False) and getattr(response, "file_to_stream", None) is None:
+                response.streaming_content = _measured_content(
+                    self, func.__name__, stats, start, contextvars.copy_context(), response.streaming_content
+                )
+                streamed = True
+            return response
+        finally:
+            current_stats.reset(token)
+            if not streamed:
+                _log_stats(self, func.__name__, stats, time.perf_counter() - start)
+
+    # passerelle lit la signature de l'endpoint pour en déduire ses paramètres
+    wrapper.__signature__ = inspect.signature(func)
+    return wrapper
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='pool_size',
+            field=models.PositiveIntegerField(default=10, help_text='Nombre maximum de connexions HTTP maintenues ouvertes vers Keycloak', verbose_name='Taille du pool de connexions'),
+        ),
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='timeout',
+            field=models.PositiveIntegerField(default=30, help_text="Délai maximum d'attente d'une réponse de Keycloak", verbose_name='Timeout (secondes)'),
+        ),
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='max_retries',
+            field=models.PositiveIntegerField(default=3, help_text="Nombre de nouvelles tentatives en cas d'erreur réseau ou de réponse 502/503/504", verbose_name='Nombre de tentatives'),
+        ),
+    ]
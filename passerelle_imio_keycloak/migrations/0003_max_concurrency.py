@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0002_http_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='max_concurrency',
+            field=models.PositiveIntegerField(default=8, help_text="Nombre maximum d'appels parallèles vers Keycloak pour un même endpoint (ne devrait pas dépasser la taille du pool de connexions)", verbose_name='Appels simultanés'),
+        ),
+    ]
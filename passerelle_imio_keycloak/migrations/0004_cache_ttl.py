@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0003_max_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(default=300, help_text="Durée de conservation des utilisateurs, groupes et membres d'un realm ; 0 pour désactiver le cache", verbose_name='Durée du cache (secondes)'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0004_cache_ttl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeycloakRealm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('users_synced_at', models.DateTimeField(null=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realms', to='passerelle_imio_keycloak.keycloakconnector')),
+            ],
+            options={
+                'unique_together': {('resource', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='KeycloakUser',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=64)),
+                ('username', models.CharField(max_length=256)),
+                ('email', models.CharField(blank=True, max_length=256)),
+                ('data', models.JSONField(default=dict)),
+                ('realm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='users', to='passerelle_imio_keycloak.keycloakrealm')),
+            ],
+            options={
+                'unique_together': {('realm', 'user_id')},
+                'indexes': [models.Index(fields=['realm', 'email'], name='keycloak_user_email_idx'), models.Index(fields=['realm', 'username'], name='keycloak_user_username_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0005_local_users'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealmExport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('realm', models.CharField(max_length=256)),
+                ('params', models.JSONField(default=dict)),
+                ('format', models.CharField(choices=[('json', 'json'), ('ndjson', 'ndjson'), ('csv', 'csv')], default='json', max_length=8)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'En erreur')], default='pending', max_length=16)),
+                ('progress', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('content', models.FileField(null=True, upload_to='passerelle_imio_keycloak/exports')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('completed', models.DateTimeField(null=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exports', to='passerelle_imio_keycloak.keycloakconnector')),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0006_realm_export'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakconnector',
+            name='rate_limit',
+            field=models.PositiveIntegerField(default=0, help_text="Nombre maximum d'appels par seconde vers Keycloak, tous processus confondus ; 0 pour ne pas limiter", verbose_name='Débit maximum (appels par seconde)'),
+        ),
+    ]
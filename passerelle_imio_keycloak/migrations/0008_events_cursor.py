@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0007_rate_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakrealm',
+            name='events_cursor',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
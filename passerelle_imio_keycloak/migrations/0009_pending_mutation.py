@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0008_events_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingMutation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('realm', models.CharField(max_length=256)),
+                ('user_id', models.CharField(max_length=64)),
+                ('op', models.CharField(max_length=32)),
+                ('target', models.CharField(blank=True, max_length=256)),
+                ('data', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'En erreur'), ('superseded', 'Remplacé')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('not_before', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed', models.DateTimeField(null=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mutations', to='passerelle_imio_keycloak.keycloakconnector')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'status', 'not_before'], name='keycloak_mutation_queue_idx'), models.Index(fields=['resource', 'realm', 'user_id'], name='keycloak_mutation_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+from passerelle_imio_keycloak.utils import user_search_text
+
+
+def fill_search_text(apps, schema_editor):
+    KeycloakUser = apps.get_model('passerelle_imio_keycloak', 'KeycloakUser')
+    users = []
+    for user in KeycloakUser.objects.iterator():
+        user.search_text = user_search_text(user.data)
+        users.append(user)
+        if len(users) >= 1000:
+            KeycloakUser.objects.bulk_update(users, ['search_text'])
+            users = []
+    KeycloakUser.objects.bulk_update(users, ['search_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0009_pending_mutation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keycloakuser',
+            name='search_text',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0010_user_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregatedVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('realm', models.CharField(max_length=256)),
+                ('params_key', models.TextField()),
+                ('version', models.CharField(max_length=32)),
+                ('digests', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aggregated_versions', to='passerelle_imio_keycloak.keycloakconnector')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'realm', 'version'], name='keycloak_aggregated_version_idx')],
+            },
+        ),
+    ]
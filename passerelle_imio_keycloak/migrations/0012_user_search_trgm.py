@@ -0,0 +1,18 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('passerelle_imio_keycloak', '0011_aggregated_version'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='keycloakuser',
+            index=GinIndex(fields=['search_text'], name='keycloak_user_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,8 +1,47 @@
-import json
+import contextvars
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import itertools
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.db import connection, connections, models, transaction
+from django.db.models.fields.json import KeyTextTransform
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.timezone import now
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from passerelle.base.models import BaseResource
 from passerelle.utils.api import endpoint
+from passerelle.utils.jsonresponse import APIError
+
+from . import aggregation, chunkcache, fastjson, metrics, mutations
+from .breaker import CircuitBreaker, RateLimiter, UpstreamUnavailable
+from .metrics import instrumented
+from .groups import GroupTree
+from .utils import USER_SEARCH_FIELDS, ResponseCache, SingleFlight, normalize_search, user_search_text
+
+# sessions HTTP persistantes, une par connecteur et par configuration
+_SESSIONS = {}
+# caches de réponses, un par connecteur (et par tenant)
+_RESPONSE_CACHES = {}
+# nombre d'appels simultanés vers Keycloak, tous endpoints confondus
+_UPSTREAM_SLOTS = {}
+# lectures en cours, partagées par les appels identiques simultanés
+_SINGLE_FLIGHTS = {}
+_REGISTRY_LOCK = threading.Lock()
 
 
 class KeycloakConnector(BaseResource):
@@ -31,13 +70,1011 @@ class KeycloakConnector(BaseResource):
         blank=True,
         verbose_name="id client",
     )
+    pool_size = models.PositiveIntegerField(
+        default=10,
+        verbose_name="Taille du pool de connexions",
+        help_text="Nombre maximum de connexions HTTP maintenues ouvertes vers Keycloak",
+    )
+    timeout = models.PositiveIntegerField(
+        default=30,
+        verbose_name="Timeout (secondes)",
+        help_text="Délai maximum d'attente d'une réponse de Keycloak",
+    )
+    max_retries = models.PositiveIntegerField(
+        default=3,
+        verbose_name="Nombre de tentatives",
+        help_text="Nombre de nouvelles tentatives en cas d'erreur réseau ou de réponse 502/503/504",
+    )
+    max_concurrency = models.PositiveIntegerField(
+        default=8,
+        verbose_name="Appels simultanés",
+        help_text="Nombre maximum d'appels parallèles vers Keycloak pour un même endpoint "
+        "(ne devrait pas dépasser la taille du pool de connexions)",
+    )
+    cache_ttl = models.PositiveIntegerField(
+        default=300,
+        verbose_name="Durée du cache (secondes)",
+        help_text="Durée de conservation des utilisateurs, groupes et membres d'un realm ; 0 pour désactiver le cache",
+    )
+    rate_limit = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Débit maximum (appels par seconde)",
+        help_text="Nombre maximum d'appels par seconde vers Keycloak, tous processus confondus ; 0 pour ne pas limiter",
+    )
     api_description = "Connecteur permettant d'intéragir avec Keycloak"
     category = "Connecteurs iMio"
-    MAX_RESULTS = 99999
+    # taille des pages demandées à Keycloak pour les listes d'utilisateurs
+    PAGE_SIZE = 500
+    # marge avant expiration à partir de laquelle on rafraîchit le token
+    TOKEN_REFRESH_MARGIN = 30
+    TOKEN_LOCK_TIMEOUT = 10
+    # un realm est rafraîchi en tâche de fond tant qu'il a été consulté récemment
+    ACTIVE_REALM_TTL = 3600
+    # durée de conservation des exports en tâche de fond
+    EXPORT_RETENTION_DAYS = 2
+    # modifications différées : taille des lots, nombre de tentatives, délai
+    # avant la première nouvelle tentative (doublé ensuite) et conservation
+    MUTATION_BATCH_SIZE = 100
+    MUTATION_MAX_ATTEMPTS = 5
+    MUTATION_RETRY_DELAY = 30
+    MUTATION_RETENTION_DAYS = 7
+    # taille de réponse à partir de laquelle les listes sont décodées au fil de l'eau
+    STREAM_DECODE_SIZE = 1024 * 1024
+    # sous-ressources de read-users-details : (chemin sous users/{id}, type de cache)
+    USER_DETAILS = {
+        "groups": ("groups", "user-groups"),
+        "credentials": ("credentials", "credentials"),
+        "idp_links": ("federated-identity", "idp-links"),
+    }
+    MAX_DETAILS_USERS = 500
+    # nombre de résultats par défaut des sources de données
+    DATASOURCE_LIMIT = 20
+    # champs retournés par défaut par realm-users-groups-aggregated
+    AGGREGATED_FIELDS = ["id", "username", "firstName", "lastName", "email", "enabled", "groups"]
+    # versions précédentes conservées par realm et filtres (paramètre since),
+    # au plus pendant AGGREGATED_VERSIONS_RETENTION_DAYS jours
+    AGGREGATED_VERSIONS_KEPT = 10
+    AGGREGATED_VERSIONS_RETENTION_DAYS = 7
+    # cache de réponses en mémoire : nombre d'entrées et durée de vie (secondes)
+    RESPONSE_CACHE_SIZE = 1000
+    RESPONSE_CACHE_TTLS = {
+        "user-groups": 30,
+        "group-members": 30,
+        "credentials": 10,
+        "idp-links": 60,
+    }
+    # disjoncteur : fenêtre d'observation, seuils d'échec et durée d'ouverture (secondes)
+    CIRCUIT_BREAKER = {"window": 30, "min_calls": 20, "failure_ratio": 0.5, "slow_call": 10, "open_seconds": 30}
+    # données expirées encore servies tant que Keycloak est indisponible (secondes)
+    STALE_SNAPSHOT_TTL = 3600
+    # durée maximale d'attente du snapshot chargé par un autre worker (secondes)
+    FLIGHT_LOCK_TIMEOUT = 120
+    # suivi des événements d'administration : au-delà de cet âge du curseur
+    # (secondes) ou de ce nombre d'événements, le realm est resynchronisé
+    EVENTS_MAX_AGE = 86400
+    EVENTS_MAX_CHANGES = 5000
+    # les événements d'administration ne couvrent ni les inscriptions, ni les
+    # modifications faites depuis la console du compte, ni les imports LDAP/IdP :
+    # un snapshot tenu à jour par les événements est rechargé entièrement
+    # au-delà de cet âge (secondes)
+    SNAPSHOT_MAX_AGE = 3600
+    # décalage d'horloge toléré entre passerelle et Keycloak (secondes)
+    EVENTS_CLOCK_SKEW = 60
 
     class Meta:
         verbose_name = "Connecteur Keycloak"
 
+    def _token_cache_key(self):
+        # les identifiants font partie de la clé : une modification de la
+        # configuration du connecteur invalide automatiquement le token
+        fingerprint = hashlib.sha256(
+            f"{self.url}|{self.client_id}|{self.username}|{self.password}".encode()
+        ).hexdigest()[:16]
+        return f"passerelle-imio-keycloak-token-{self.pk}-{fingerprint}"
+
+    def _request_token(self, data):
+        url = f"{self.url}realms/master/protocol/openid-connect/token"
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        r = self._send("post", url, headers=headers, data=data)
+        r.raise_for_status()
+        response = self._json(r)
+        now = time.time()
+        return {
+            "access_token": response["access_token"],
+            "expires_at": now + response.get("expires_in", 60),
+            "refresh_token": response.get("refresh_token"),
+            "refresh_expires_at": now + response.get("refresh_expires_in", 0),
+        }
+
+    def _renew_token(self, token):
+        if token and token.get("refresh_token") and token["refresh_expires_at"] - self.TOKEN_REFRESH_MARGIN > time.time():
+            try:
+                return self._request_token({
+                    "client_id": self.client_id,
+                    "grant_type": "refresh_token",
+                    "refresh_token": token["refresh_token"],
+                })
+            except requests.RequestException:
+                # session expirée côté Keycloak, on repasse par le mot de passe
+                pass
+        return self._request_token({
+            "client_id": self.client_id,
+            "grant_type": "password",
+            "username": self.username,
+            "password": self.password,
+        })
+
+    def get_token(self):
+        """
+        Retourne un access token valide, partagé entre les workers via le cache
+        Django. Le token est rafraîchi (refresh_token) peu avant son expiration,
+        un seul worker à la fois s'en charge.
+        """
+        key = self._token_cache_key()
+        now = time.time()
+        token = cache.get(key)
+        if token and token["expires_at"] - self.TOKEN_REFRESH_MARGIN > now:
+            return token["access_token"]
+
+        lock_key = f"{key}-lock"
+        locked = cache.add(lock_key, True, self.TOKEN_LOCK_TIMEOUT)
+        if not locked:
+            # un autre worker rafraîchit déjà le token
+            if token and token["expires_at"] > now:
+                return token["access_token"]
+            deadline = now + self.TOKEN_LOCK_TIMEOUT
+            while not locked and time.time() < deadline:
+                time.sleep(0.1)
+                token = cache.get(key)
+                if token and token["expires_at"] > time.time():
+                    return token["access_token"]
+                # verrou expiré ou libéré sans token (échec de l'autre worker)
+                locked = cache.add(lock_key, True, self.TOKEN_LOCK_TIMEOUT)
+
+        try:
+            token = self._renew_token(token)
+            timeout = max(token["expires_at"], token["refresh_expires_at"]) - time.time()
+            cache.set(key, token, max(int(timeout), 1))
+        finally:
+            # ne jamais libérer le verrou d'un autre worker
+            if locked:
+                cache.delete(lock_key)
+        return token["access_token"]
+
+    def invalidate_token(self):
+        cache.delete(self._token_cache_key())
+
+    @property
+    def process_key(self):
+        """
+        Identifiant du connecteur dans les registres du processus : ceux-ci
+        sont communs à tous les tenants (hobo), dont les connecteurs peuvent
+        avoir la même clé primaire.
+        """
+        return (getattr(connection, "schema_name", None), self.pk, self.url)
+
+    @property
+    def session(self):
+        """
+        Session HTTP keep-alive partagée par toutes les requêtes du connecteur
+        dans le processus, construite à partir de la session passerelle
+        (journalisation, proxy) avec un pool de connexions dédié.
+        """
+        key = (self.process_key, self.pool_size, self.timeout, self.max_retries)
+        session = _SESSIONS.get(key)
+        if session is None:
+            with _REGISTRY_LOCK:
+                session = _SESSIONS.get(key)
+                if session is None:
+                    session = self.requests
+                    session.timeout = self.timeout
+                    retry = Retry(
+                        total=self.max_retries,
+                        backoff_factor=0.5,
+                        status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+                        raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size,
+                        max_retries=retry,
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    # session de l'ancienne configuration du connecteur, fermée
+                    # par le ramasse-miettes quand plus aucun thread ne l'utilise
+                    for old_key in [k for k in _SESSIONS if k[0][:2] == self.process_key[:2]]:
+                        del _SESSIONS[old_key]
+                    _SESSIONS[key] = session
+        return session
+
+    @property
+    def upstream_slots(self):
+        key = (self.process_key, self.max_concurrency)
+        with _REGISTRY_LOCK:
+            if key not in _UPSTREAM_SLOTS:
+                _UPSTREAM_SLOTS[key] = threading.BoundedSemaphore(max(self.max_concurrency, 1))
+            return _UPSTREAM_SLOTS[key]
+
+    @property
+    def circuit_breaker(self):
+        return CircuitBreaker(f"passerelle-imio-keycloak-{self.pk}-breaker", **self.CIRCUIT_BREAKER)
+
+    @property
+    def rate_limiter(self):
+        return RateLimiter(f"passerelle-imio-keycloak-{self.pk}-limiter", self.rate_limit)
+
+    def _send(self, method, url, **kwargs):
+        breaker = self.circuit_breaker
+        try:
+            # débit réduit tant que Keycloak renvoie des erreurs
+            self.rate_limiter.acquire(self.timeout, breaker.error_ratio() if self.rate_limit else 0)
+        except UpstreamUnavailable:
+            metrics.record_rejection(self.slug, "rate-limit")
+            raise
+        # les appels parallèles de plusieurs endpoints (ou realms) se partagent
+        # le même budget de max_concurrency appels en cours ; plutôt que de
+        # s'empiler derrière un Keycloak lent, on abandonne. Ce refus local
+        # n'est pas un échec de Keycloak : il n'entre pas dans le disjoncteur.
+        if not self.upstream_slots.acquire(timeout=self.timeout):
+            metrics.record_rejection(self.slug, "concurrency")
+            raise UpstreamUnavailable("Keycloak indisponible (trop d'appels en cours)")
+        try:
+            try:
+                probe = breaker.before_call()
+            except UpstreamUnavailable:
+                metrics.record_rejection(self.slug, "circuit-open")
+                raise
+            # l'attente d'une place n'est pas comptée dans la durée de l'appel
+            start = time.perf_counter()
+            failed = True
+            try:
+                r = self.session.request(method, url, **kwargs)
+                failed = r.status_code >= 500 or time.perf_counter() - start > breaker.slow_call
+            finally:
+                breaker.after_call(failed, probe)
+        finally:
+            self.upstream_slots.release()
+        if kwargs.get("stream"):
+            nbytes = int(r.headers.get("Content-Length") or 0)
+        else:
+            nbytes = len(r.content)
+        metrics.record_upstream(
+            self.slug, method, url[len(self.url):], r.status_code, time.perf_counter() - start, nbytes
+        )
+        return r
+
+    def _request(self, method, path, headers=None, **kwargs):
+        url = f"{self.url}{path}"
+        headers = dict(headers or {})
+        if "json" in kwargs:
+            headers["Content-Type"] = "application/json"
+            kwargs["data"] = fastjson.dumps(kwargs.pop("json")).encode()
+        headers["Authorization"] = "Bearer " + self.get_token()
+        r = self._send(method, url, headers=headers, **kwargs)
+        if r.status_code == 401:
+            # token révoqué côté Keycloak avant son expiration
+            self.invalidate_token()
+            headers["Authorization"] = "Bearer " + self.get_token()
+            r.close()
+            r = self._send(method, url, headers=headers, **kwargs)
+        return r
+
+    def _json(self, r):
+        start = time.perf_counter()
+        data = fastjson.loads(r.content)
+        metrics.record_json_decode(time.perf_counter() - start)
+        return data
+
+    def _json_items(self, r):
+        """
+        Éléments d'une réponse JSON de type liste demandée avec stream=True :
+        au-delà de STREAM_DECODE_SIZE octets et si ijson est installé, la
+        réponse est décodée au fil de sa lecture, sans être chargée en mémoire.
+        """
+        size = r.headers.get("Content-Length")
+        if not fastjson.ijson or (size and int(size) < self.STREAM_DECODE_SIZE):
+            return self._json(r) or []
+        # réponse éventuellement compressée (gzip)
+        r.raw.decode_content = True
+        return fastjson.iter_items(r.raw)
+
+    def _snapshot_key(self, realm, part):
+        return f"passerelle-imio-keycloak-{self.pk}-snapshot-{realm}-{part}"
+
+    def _active_realms_key(self):
+        return f"passerelle-imio-keycloak-{self.pk}-active-realms"
+
+    def _fetch_snapshot(self, realm, part, groups=None):
+        if part == "users":
+            return self._fetch_users(realm)
+        if part == "groups":
+            r = self._request("get", f"admin/realms/{realm}/groups", stream=True)
+            r.raise_for_status()
+            groups = list(self._json_items(r))
+
+            def fetch_children(group_id):
+                return list(self._iter_pages(
+                    f"admin/realms/{realm}/groups/{group_id}/children", {"briefRepresentation": "true"}
+                ))
+
+            # l'arborescence complète, sous-groupes compris
+            return GroupTree(groups, fetch_children, self._parallel_map).roots
+        # members : group_id -> [user_id, ...] pour tous les groupes de l'arborescence
+        if groups is None:
+            groups = self.get_group_tree(realm)
+        return self._fetch_member_ids(realm, [g["id"] for g in groups if g.get("id")])
+
+    def _fetch_member_ids(self, realm, group_ids):
+        def get_members(group_id):
+            return [
+                m["id"]
+                for m in self._iter_pages(
+                    f"admin/realms/{realm}/groups/{group_id}/members", {"briefRepresentation": "true"}
+                )
+                if m.get("id")
+            ]
+
+        group_ids = list(group_ids)
+        return dict(zip(group_ids, self._parallel_map(get_members, group_ids)))
+
+    def _fetch_users(self, realm):
+        """
+        Tous les utilisateurs d'un realm : le nombre d'utilisateurs (users/count)
+        permet de demander toutes les pages en parallèle.
+        """
+        r = self._request("get", f"admin/realms/{realm}/users/count")
+        if not r.ok:
+            return list(self._iter_pages(f"admin/realms/{realm}/users"))
+        count = self._json(r)
+        firsts = range(0, count + 1, self.PAGE_SIZE)
+
+        def get_page(first):
+            r = self._request("get", f"admin/realms/{realm}/users", params={"first": first, "max": self.PAGE_SIZE})
+            r.raise_for_status()
+            return self._json(r) or []
+
+        pages = self._parallel_map(get_page, firsts)
+        users = list(itertools.chain.from_iterable(pages))
+        if len(pages[-1]) == self.PAGE_SIZE:
+            # utilisateurs créés entre-temps
+            first = firsts[-1] + self.PAGE_SIZE
+            users.extend(self._iter_pages(f"admin/realms/{realm}/users", {"first": first}))
+        return users
+
+    def get_group_tree(self, realm):
+        return GroupTree(self.get_snapshot(realm, "groups"))
+
+    def get_snapshot(self, realm, part, groups=None):
+        """
+        Retourne les utilisateurs ("users"), les groupes ("groups") ou les
+        membres des groupes ("members") d'un realm depuis le cache, ou depuis
+        Keycloak si le cache est désactivé ou expiré.
+        """
+        data = self.cached_snapshot(realm, part)
+        if data is not None:
+            return data
+        try:
+            return self.refresh_snapshot(realm, part, groups=groups)
+        except UpstreamUnavailable:
+            # Keycloak indisponible : les données expirées valent mieux que rien
+            data = self.cached_snapshot(realm, part, stale=True)
+            if data is None:
+                raise
+            metrics.record_stale(self.slug, "snapshot")
+            return data
+
+    def cached_snapshot(self, realm, part, stale=False):
+        """
+        Comme get_snapshot mais sans appel à Keycloak : None si absent du cache
+        (ou expiré, sauf si stale).
+        """
+        if not self.cache_ttl:
+            return None
+        realms = cache.get(self._active_realms_key()) or {}
+        if realm not in realms or realms[realm] < time.time() - 60:
+            realms[realm] = time.time()
+            cache.set(self._active_realms_key(), realms, self.ACTIVE_REALM_TTL)
+        key = self._snapshot_key(realm, part)
+        head = chunkcache.get_head(key)
+        data = None
+        if head is not None and (stale or head["timestamp"] >= time.time() - self.cache_ttl):
+            data = chunkcache.get_value(key, head)
+        metrics.record_cache(self.slug, "snapshot", data is not None)
+        return data
+
+    def refresh_snapshot(self, realm, part, groups=None):
+        if not self.cache_ttl:
+            return self._single_flight(("snapshot", realm, part), lambda: self._fetch_snapshot(realm, part, groups=groups))
+
+        def fetch():
+            data = self._fetch_snapshot(realm, part, groups=groups)
+            self._store_snapshot(realm, part, data)
+            return data
+
+        # entre workers, les snapshots (des centaines d'appels) sont partagés
+        # par le cache : les autres workers attendent celui qui est stocké
+        started = time.time()
+        return self._single_flight(
+            ("snapshot", realm, part), fetch, read_shared=lambda: self._load_snapshot(realm, part, started)
+        )
+
+    def _store_snapshot(self, realm, part, data, fetched=None):
+        stored = time.time()
+        # conservé au-delà de cache_ttl pour être servi si Keycloak devient indisponible
+        return chunkcache.set_value(
+            self._snapshot_key(realm, part),
+            data,
+            self.cache_ttl + self.STALE_SNAPSHOT_TTL,
+            timestamp=stored,
+            fetched=fetched or stored,
+        )
+
+    def _load_snapshot(self, realm, part, fetched_since):
+        """Snapshot en cache chargé de Keycloak depuis fetched_since, ou None."""
+        key = self._snapshot_key(realm, part)
+        head = chunkcache.get_head(key)
+        if head is None or head["fetched"] < fetched_since:
+            return None
+        return chunkcache.get_value(key, head)
+
+    def invalidate_snapshot(self, realm, *parts):
+        # les réponses en cache du realm peuvent aussi dépendre de ces données
+        self.response_cache.invalidate(realm)
+        cache.delete_many([self._snapshot_key(realm, part) for part in parts])
+
+    @property
+    def response_cache(self):
+        with _REGISTRY_LOCK:
+            return _RESPONSE_CACHES.setdefault(self.process_key, ResponseCache(self.RESPONSE_CACHE_SIZE))
+
+    def _cached_get(self, realm, path, kind, params=None, use_cache=None, raise_errors=False):
+        """
+        GET vers Keycloak dont la réponse JSON est conservée quelques secondes
+        (durée selon le type de ressource) dans le cache LRU du processus ;
+        les réponses en erreur sont retournées telles quelles, sauf si
+        raise_errors.
+        """
+        use_cache = use_cache is None or self._bool_parameter(use_cache)
+        key = (realm, path, tuple(sorted((params or {}).items())))
+        if use_cache:
+            data = self.response_cache.get(key)
+            metrics.record_cache(self.slug, "response", data is not ResponseCache.MISSING)
+            if data is not ResponseCache.MISSING:
+                return data
+
+        def fetch():
+            r = self._request("get", path, params=params)
+            if r.status_code >= 400:
+                try:
+                    return r.status_code, self._json(r)
+                except ValueError:
+                    # page d'erreur d'un proxy (502, 503...) plutôt que de Keycloak
+                    return r.status_code, r.text
+            return r.status_code, self._json(r)
+
+        try:
+            status, data = self._single_flight(key, fetch)
+        except UpstreamUnavailable:
+            data = self.response_cache.get(key, stale=True)
+            if data is ResponseCache.MISSING:
+                raise
+            metrics.record_stale(self.slug, "response")
+            return data
+        if status >= 400:
+            if raise_errors:
+                raise requests.HTTPError(f"{status} Error for url: {self.url}{path}")
+            return data
+        self.response_cache.set(key, data, self.RESPONSE_CACHE_TTLS[kind])
+        return data
+
+    @property
+    def single_flight(self):
+        with _REGISTRY_LOCK:
+            return _SINGLE_FLIGHTS.setdefault(self.process_key, SingleFlight())
+
+    def _single_flight(self, key, func, read_shared=None):
+        """
+        Exécute func (une lecture sur Keycloak) une seule fois pour des appels
+        identiques simultanés : dans le processus, les appels suivants
+        attendent le résultat du premier ; entre workers (si read_shared), un
+        verrou dans le cache désigne celui qui interroge Keycloak, les autres
+        lisent avec read_shared le résultat qu'il a stocké.
+        """
+        if read_shared:
+            (data, shared_by_worker), shared = self.single_flight.do(
+                key, lambda: self._shared_flight(key, func, read_shared)
+            )
+        else:
+            data, shared = self.single_flight.do(key, func)
+            shared_by_worker = False
+        metrics.record_cache(self.slug, "single-flight", shared or shared_by_worker)
+        return data
+
+    def _shared_flight(self, key, func, read_shared):
+        lock_key = "passerelle-imio-keycloak-%s-flight-%s-lock" % (
+            self.pk, hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        )
+        if cache.add(lock_key, True, self.FLIGHT_LOCK_TIMEOUT):
+            try:
+                return func(), False
+            finally:
+                cache.delete(lock_key)
+        deadline = time.time() + self.FLIGHT_LOCK_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(0.05)
+            # verrou consulté avant le résultat : stocké avant d'être libéré
+            locked = cache.get(lock_key)
+            data = read_shared()
+            if data is not None:
+                return data, True
+            if not locked:
+                # l'autre worker a échoué ou son résultat n'a pas pu être stocké
+                break
+        return func(), False
+
+    def _active_realms(self):
+        if not self.cache_ttl:
+            return set()
+        realms = cache.get(self._active_realms_key()) or {}
+        return {realm for realm, last_access in realms.items() if last_access >= time.time() - self.ACTIVE_REALM_TTL}
+
+    def every5min(self):
+        super().every5min()
+        if self.mutations.filter(status="pending", not_before__lte=now()).exists():
+            self.apply_mutations()
+        realms = self._active_realms()
+        realms.update(self.realms.filter(users_synced_at__isnull=False).values_list("name", flat=True))
+        for realm in realms:
+            try:
+                self.sync_changes(realm)
+            except requests.RequestException as e:
+                self.logger.warning("keycloak: cannot synchronize realm %s changes: %s", realm, e)
+
+    def sync_changes(self, realm):
+        """
+        Met à jour les snapshots et les utilisateurs locaux d'un realm à partir
+        des événements d'administration Keycloak survenus depuis le curseur ;
+        le realm est entièrement resynchronisé si le curseur est perdu (absent,
+        trop ancien, trop d'événements) ou si Keycloak n'enregistre pas ces
+        événements, et ses snapshots le sont au plus tard après
+        SNAPSHOT_MAX_AGE (voir aussi hourly pour la table locale).
+        """
+        keycloak_realm, _ = KeycloakRealm.objects.get_or_create(resource=self, name=realm)
+        started = time.time()
+        r = self._request("get", f"admin/realms/{realm}/events/config")
+        enabled = r.ok and bool(self._json(r).get("adminEventsEnabled"))
+        events = self._admin_events(realm, keycloak_realm.events_cursor) if enabled else None
+        if events is None:
+            self.resync_realm(realm, local_users=enabled)
+        else:
+            self._apply_admin_events(realm, keycloak_realm, events)
+        # les événements de la dernière minute seront relus (sans effet) : ils
+        # peuvent être horodatés un peu avant started par l'horloge de Keycloak
+        keycloak_realm.events_cursor = int((started - self.EVENTS_CLOCK_SKEW) * 1000) if enabled else None
+        keycloak_realm.save(update_fields=["events_cursor"])
+
+    def resync_realm(self, realm, local_users=True):
+        if realm in self._active_realms():
+            groups = GroupTree(self.refresh_snapshot(realm, "groups"))
+            self.refresh_snapshot(realm, "members", groups=groups)
+            self.refresh_snapshot(realm, "users")
+        if local_users and self.realms.filter(name=realm, users_synced_at__isnull=False).exists():
+            self.sync_users(realm)
+
+    def _admin_events(self, realm, cursor):
+        """
+        Événements d'administration (utilisateurs, groupes, appartenances)
+        horodatés à partir de cursor (ms), ou None si le curseur est perdu.
+        """
+        if not cursor or cursor < (time.time() - self.EVENTS_MAX_AGE) * 1000:
+            return None
+        # dateFrom est une date, interprétée dans le fuseau de Keycloak
+        date_from = datetime.datetime.fromtimestamp(cursor / 1000 - 86400, datetime.timezone.utc).strftime("%Y-%m-%d")
+        params = {"dateFrom": date_from, "resourceTypes": ["USER", "GROUP", "GROUP_MEMBERSHIP"]}
+        events = []
+        for event in self._iter_pages(f"admin/realms/{realm}/admin-events", params):
+            # Keycloak retourne les événements du plus récent au plus ancien
+            if event.get("time", 0) < cursor:
+                break
+            events.append(event)
+            if len(events) > self.EVENTS_MAX_CHANGES:
+                return None
+        return events
+
+    def _fetch_user(self, realm, user_id):
+        r = self._request("get", f"admin/realms/{realm}/users/{user_id}")
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return self._json(r)
+
+    def _apply_admin_events(self, realm, keycloak_realm, events):
+        user_ids, group_ids, groups_changed = set(), set(), False
+        for event in events:
+            path = (event.get("resourcePath") or "").split("/")
+            if event.get("resourceType") == "GROUP":
+                groups_changed = True
+            elif event.get("resourceType") == "GROUP_MEMBERSHIP" and len(path) == 4:
+                group_ids.add(path[3])
+            elif event.get("resourceType") == "USER" and path[0] == "users" and len(path) > 1:
+                user_ids.add(path[1])
+        # utilisateur modifié -> représentation à jour, None s'il a été supprimé
+        users = dict(zip(user_ids, self._parallel_map(lambda user_id: self._fetch_user(realm, user_id), user_ids)))
+        deleted = {user_id for user_id, user in users.items() if user is None}
+
+        if keycloak_realm.users_synced_at and users:
+            with transaction.atomic():
+                keycloak_realm.users.filter(user_id__in=deleted).delete()
+                for user_id, data in users.items():
+                    if data is not None:
+                        user, _ = KeycloakUser.objects.get_or_create(realm=keycloak_realm, user_id=user_id)
+                        user.data = data
+                        user.set_fields().save()
+
+        def patch_users(data):
+            known = {u.get("id") for u in data}
+            data = [users.get(u.get("id"), u) if u.get("id") in users else u for u in data]
+            data.extend(u for user_id, u in users.items() if u is not None and user_id not in known)
+            return [u for u in data if u is not None]
+
+        groups = None
+        if groups_changed:
+            groups = self._fetch_snapshot(realm, "groups")
+        tree = GroupTree(groups) if groups is not None else None
+
+        def patch_members(members):
+            if tree is not None:
+                members = {group_id: members[group_id] for group_id in tree.by_id if group_id in members}
+            to_fetch = set(group_ids)
+            to_fetch.update(group_id for group_id in (tree.by_id if tree is not None else ()) if group_id not in members)
+            members.update(self._fetch_member_ids(realm, to_fetch))
+            if deleted:
+                members = {
+                    group_id: [user_id for user_id in member_ids if user_id not in deleted]
+                    for group_id, member_ids in members.items()
+                }
+            return members
+
+        self._patch_snapshot(realm, "groups", lambda data: groups if groups is not None else data)
+        self._patch_snapshot(realm, "members", patch_members)
+        self._patch_snapshot(realm, "users", patch_users)
+        if events:
+            self.response_cache.invalidate(realm)
+
+    def _patch_snapshot(self, realm, part, func):
+        """
+        Applique func au snapshot en cache, qui est ainsi considéré à jour ;
+        le snapshot est rechargé de Keycloak s'il date de plus de
+        SNAPSHOT_MAX_AGE, sans effet s'il n'est pas en cache.
+        """
+        if not self.cache_ttl:
+            return
+        key = self._snapshot_key(realm, part)
+        head = chunkcache.get_head(key)
+        if head is None:
+            return
+        if head["fetched"] < time.time() - self.SNAPSHOT_MAX_AGE:
+            self.refresh_snapshot(realm, part)
+            return
+        data = chunkcache.get_value(key, head)
+        if data is not None:
+            self._store_snapshot(realm, part, func(data), fetched=head["fetched"])
+
+    def sync_users(self, realm):
+        """
+        Recopie les utilisateurs d'un realm dans la table locale KeycloakUser.
+        """
+        keycloak_realm, _ = KeycloakRealm.objects.get_or_create(resource=self, name=realm)
+        users = [
+            KeycloakUser(realm=keycloak_realm, user_id=u["id"], data=u).set_fields()
+            for u in self._iter_pages(f"admin/realms/{realm}/users")
+            if u.get("id")
+        ]
+        with transaction.atomic():
+            keycloak_realm.users.all().delete()
+            KeycloakUser.objects.bulk_create(users, batch_size=1000)
+            keycloak_realm.users_synced_at = now()
+            keycloak_realm.save(update_fields=["users_synced_at"])
+
+    def _synced_realm(self, realm):
+        """
+        Realm de la table locale, ou None s'il n'a pas encore été synchronisé,
+        auquel cas une synchronisation est programmée.
+        """
+        keycloak_realm, _ = KeycloakRealm.objects.get_or_create(resource=self, name=realm)
+        if not keycloak_realm.users_synced_at:
+            # au plus une synchronisation programmée par heure
+            if cache.add(f"passerelle-imio-keycloak-{self.pk}-sync-users-{realm}", True, 3600):
+                self.add_job("sync_users", realm=realm)
+            return None
+        return keycloak_realm
+
+    def lookup_local_users(self, realm, **kwargs):
+        """
+        Recherche des utilisateurs dans la table locale (email ou username) ;
+        retourne None si le realm n'a pas encore été synchronisé.
+        """
+        keycloak_realm = self._synced_realm(realm)
+        if keycloak_realm is None:
+            return None
+        lookup = {key: value.strip().lower() for key, value in kwargs.items()}
+        return [user.data for user in keycloak_realm.users.filter(**lookup)]
+
+    def search_local_users(self, realm, q=None, user_id=None, limit=None):
+        """
+        Utilisateurs de la table locale dont le nom d'utilisateur, l'adresse
+        mail, le prénom et le nom contiennent tous les mots de q (sans tenir
+        compte des accents ni de la casse, index trigramme), ou dont le GUID
+        est user_id ; None si le realm n'a pas encore été synchronisé. Seuls
+        id et les champs de USER_SEARCH_FIELDS sont retournés.
+        """
+        keycloak_realm = self._synced_realm(realm)
+        if keycloak_realm is None:
+            return None
+        users = keycloak_realm.users.all()
+        if user_id:
+            users = users.filter(user_id=user_id)
+        for word in normalize_search(q).split():
+            users = users.filter(search_text__contains=word)
+        rows = users.order_by("username").values_list(
+            "user_id", *(KeyTextTransform(field, "data") for field in USER_SEARCH_FIELDS)
+        )[:limit]
+        return [dict(zip(("id",) + USER_SEARCH_FIELDS, row)) for row in rows]
+
+    def hourly(self):
+        super().hourly()
+        # même si every5min suit les événements d'administration, ceux-ci ne
+        # couvrent pas les inscriptions, la console du compte ni les imports
+        # LDAP/IdP : la table locale est entièrement resynchronisée
+        for realm in self.realms.filter(users_synced_at__isnull=False).values_list("name", flat=True):
+            try:
+                self.sync_users(realm)
+            except requests.RequestException as e:
+                self.logger.warning("keycloak: cannot synchronize realm %s users: %s", realm, e)
+
+    def _iter_pages(self, path, params=None):
+        """
+        Parcourt une liste Keycloak page par page (paramètres first/max),
+        sans jamais charger plus d'une page en mémoire.
+        """
+        params = dict(params or {})
+        first = params.pop("first", 0)
+        while True:
+            params.update({"first": first, "max": self.PAGE_SIZE})
+            r = self._request("get", path, params=params)
+            r.raise_for_status()
+            page = self._json(r) or []
+            yield from page
+            if len(page) < self.PAGE_SIZE:
+                break
+            first += self.PAGE_SIZE
+
+    def _stream_data(self, items, meta=None):
+        """
+        Réponse JSON {"err": 0, "data": [...]} produite au fil de l'eau ; la
+        première page est récupérée avant de répondre afin que les erreurs
+        de Keycloak soient remontées normalement.
+        """
+        items = iter(items)
+        try:
+            head = [next(items)]
+        except StopIteration:
+            head = []
+
+        def content():
+            yield '{"err": 0, "data": ['
+            for i, item in enumerate(itertools.chain(head, items)):
+                yield ("," if i else "") + fastjson.dumps(item)
+            if meta is not None:
+                yield '], "meta": ' + fastjson.dumps(meta) + "}"
+            else:
+                yield "]}"
+
+        return StreamingHttpResponse(content(), content_type="application/json")
+
+    def _int_parameter(self, name, value, default):
+        if value in (None, ""):
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise APIError(f"{name} doit être un entier", http_status=400)
+        if value < 0:
+            raise APIError(f"{name} doit être positif", http_status=400)
+        return value
+
+    def _bool_parameter(self, value):
+        return str(value).lower() in ("1", "true", "yes", "on")
+
+    def _dry_run_parameter(self, value):
+        """
+        Paramètre dry_run des endpoints qui suppriment en masse : seul un
+        « false » explicite applique les changements, pas une valeur absente
+        ou vide (variable de gabarit non renseignée).
+        """
+        return str(value).strip().lower() not in ("0", "false", "no", "off")
+
+    def _parallel_map(self, func, items):
+        """
+        Applique func à chaque élément avec au plus max_concurrency appels
+        simultanés ; les résultats sont retournés dans l'ordre des éléments.
+        """
+        items = list(items)
+        workers = min(max(self.max_concurrency, 1), len(items))
+        if workers <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [self._submit(executor, func, item) for item in items]
+            return [future.result() for future in futures]
+
+    def _as_completed_map(self, func, items):
+        """
+        Comme _parallel_map mais produit les couples (élément, résultat ou
+        exception) au fur et à mesure qu'ils sont terminés.
+        """
+        items = list(items)
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(max(self.max_concurrency, 1), len(items))) as executor:
+            futures = {self._submit(executor, func, item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+
+    def _submit(self, executor, func, item):
+        def run(item):
+            try:
+                return func(item)
+            finally:
+                # connexions à la base ouvertes par le thread
+                connections.close_all()
+
+        # chaque thread hérite du contexte courant (mesures de l'endpoint)
+        return executor.submit(contextvars.copy_context().run, run, item)
+
+    def _create_user(self, realm, data):
+        r = self._request("post", f"admin/realms/{realm}/users", json=data)
+        r.raise_for_status()
+        self.invalidate_snapshot(realm, "users")
+        # Keycloak retourne l'adresse du nouvel utilisateur
+        return r.headers.get("Location", "").rstrip("/").rsplit("/", 1)[-1] or None
+
+    def _update_user(self, realm, user_id, data):
+        data = {key: value for key, value in data.items() if value is not None}
+        r = self._request("put", f"admin/realms/{realm}/users/{user_id}", json=data)
+        r.raise_for_status()
+        self.invalidate_snapshot(realm, "users")
+        for user in KeycloakUser.objects.filter(realm__resource=self, realm__name=realm, user_id=user_id):
+            user.data.update(data)
+            user.set_fields()
+            user.save()
+
+    def _delete_user(self, realm, user_id):
+        r = self._request("delete", f"admin/realms/{realm}/users/{user_id}")
+        r.raise_for_status()
+        self.invalidate_snapshot(realm, "users", "members")
+        KeycloakUser.objects.filter(realm__resource=self, realm__name=realm, user_id=user_id).delete()
+
+    def _add_user_group(self, realm, user_id, group_id):
+        r = self._request("put", f"admin/realms/{realm}/users/{user_id}/groups/{group_id}")
+        r.raise_for_status()
+        self.invalidate_snapshot(realm, "members")
+
+    def _delete_user_group(self, realm, user_id, group_id):
+        r = self._request("delete", f"admin/realms/{realm}/users/{user_id}/groups/{group_id}")
+        r.raise_for_status()
+        self.invalidate_snapshot(realm, "members")
+
+    def _create_idp_link(self, realm, user_id, provider_id, data):
+        r = self._request("post", f"admin/realms/{realm}/users/{user_id}/federated-identity/{provider_id}", json=data)
+        r.raise_for_status()
+        self.response_cache.invalidate(realm)
+
+    def _delete_idp_link(self, realm, user_id, provider_id):
+        r = self._request("delete", f"admin/realms/{realm}/users/{user_id}/federated-identity/{provider_id}")
+        r.raise_for_status()
+        self.response_cache.invalidate(realm)
+
+    def _delete_user_credential(self, realm, user_id, credential_id):
+        r = self._request("delete", f"admin/realms/{realm}/users/{user_id}/credentials/{credential_id}")
+        r.raise_for_status()
+        self.response_cache.invalidate(realm)
+
+    def _parse_operations(self, request):
+        body = request.body.decode("utf-8")
+        if "ndjson" in request.headers.get("Content-Type", ""):
+            operations = []
+            for line in body.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    operations.append(fastjson.loads(line))
+                except ValueError as e:
+                    # ligne illisible : signalée dans son résultat, sans interrompre le lot
+                    operations.append(ValueError(f"JSON invalide : {e}"))
+            return operations
+        try:
+            operations = fastjson.loads(body)
+        except ValueError as e:
+            raise APIError(f"JSON invalide : {e}", http_status=400)
+        if not isinstance(operations, list):
+            raise APIError("une liste d'opérations est attendue", http_status=400)
+        return operations
+
+    @staticmethod
+    def _operation_field(operation, name):
+        value = operation.get(name)
+        if not value:
+            raise ValueError(f"{name} manquant")
+        if not isinstance(value, str):
+            raise ValueError(f"{name} invalide")
+        return value
+
+    @staticmethod
+    def _operation_data(operation):
+        data = operation.get("data") or {}
+        if not isinstance(data, dict):
+            raise ValueError("data invalide")
+        return data
+
+    def _apply_user_operation(self, realm, operation):
+        """
+        Applique une opération de bulk-users ; retourne le GUID de
+        l'utilisateur créé (create). Lève ValueError si l'opération est
+        invalide, RequestException si Keycloak la refuse.
+        """
+        if isinstance(operation, ValueError):
+            # ligne NDJSON illisible
+            raise operation
+        if not isinstance(operation, dict):
+            raise ValueError("opération invalide")
+        op = operation.get("op")
+        if op == "create":
+            return self._create_user(realm, self._operation_data(operation))
+        user_id = self._operation_field(operation, "user_id")
+        if op == "update":
+            self._update_user(realm, user_id, self._operation_data(operation))
+        elif op == "delete":
+            self._delete_user(realm, user_id)
+        elif op in ("add-group", "remove-group"):
+            group_id = self._operation_field(operation, "group_id")
+            if op == "add-group":
+                self._add_user_group(realm, user_id, group_id)
+            else:
+                self._delete_user_group(realm, user_id, group_id)
+        elif op in ("add-idp-link", "remove-idp-link"):
+            provider_id = self._operation_field(operation, "provider_id")
+            if op == "add-idp-link":
+                self._create_idp_link(realm, user_id, provider_id, self._operation_data(operation))
+            else:
+                self._delete_idp_link(realm, user_id, provider_id)
+        elif op == "remove-credential":
+            self._delete_user_credential(realm, user_id, self._operation_field(operation, "credential_id"))
+        else:
+            raise ValueError(f"opération inconnue : {op}")
+
+    def _run_user_operation(self, realm, index, operation):
+        result = {"index": index, "err": 0}
+        if isinstance(operation, dict):
+            result["op"] = operation.get("op")
+            if result["op"] != "create":
+                result["user_id"] = operation.get("user_id")
+        try:
+            user_id = self._apply_user_operation(realm, operation)
+            if result.get("op") == "create":
+                result["user_id"] = user_id
+        except ValueError as e:
+            result.update({"err": 1, "err_desc": str(e)})
+        except requests.RequestException as e:
+            result.update({"err": 1, "err_desc": str(e)})
+            if e.response is not None:
+                result["status"] = e.response.status_code
+        return result
+
     @endpoint(
         methods=["get"],
         name="get-bearer-token",
@@ -47,18 +1084,66 @@ class KeycloakConnector(BaseResource):
         display_order=1,
         display_category="Access",
     )
+    @instrumented
     def access_token(self, request):
-        url = f"{self.url}realms/master/protocol/openid-connect/token"
-        payload = (
-            f'client_id={self.client_id}&'
-            f'password={self.password}&'
-            f'grant_type=password&'
-            f'username={self.username}'
+        return {"access_token": self.get_token()}
+
+    @endpoint(
+        methods=["get"],
+        name="cache-stats",
+        perm="can_access",
+        description="Statistiques du cache de réponses",
+        long_description="Nombre d'entrées, de succès et d'échecs du cache de réponses du processus courant.",
+        display_order=2,
+        display_category="Access",
+    )
+    @instrumented
+    def cache_stats(self, request):
+        return {"data": dict(self.response_cache.stats(), single_flight=self.single_flight.stats())}
+
+    @endpoint(
+        methods=["get"],
+        name="upstream-status",
+        perm="can_access",
+        description="État des protections des appels à Keycloak",
+        long_description=(
+            "État du disjoncteur (closed, open, half-open), appels et échecs de la fenêtre courante "
+            "et limites de débit et de concurrence."
+        ),
+        display_order=4,
+        display_category="Access",
+    )
+    @instrumented
+    def upstream_status(self, request):
+        breaker = self.circuit_breaker
+        calls, failures = breaker.counters()
+        return {
+            "data": {
+                "state": breaker.state(),
+                "window_calls": calls,
+                "window_failures": failures,
+                "rate_limit": self.rate_limit,
+                "max_concurrency": self.max_concurrency,
+            }
+        }
+
+    @endpoint(
+        methods=["get"],
+        name="metrics",
+        perm="can_access",
+        description="Métriques Prometheus",
+        long_description="Compteurs et histogrammes des appels à Keycloak du processus courant (nécessite prometheus_client).",
+        display_order=3,
+        display_category="Access",
+    )
+    @instrumented
+    def prometheus_metrics(self, request):
+        if not metrics.prometheus_client:
+            raise APIError("prometheus_client n'est pas installé", http_status=501)
+        return HttpResponse(
+            metrics.prometheus_client.generate_latest(),
+            content_type=metrics.prometheus_client.CONTENT_TYPE_LATEST,
         )
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        r = requests.post(url=url, headers=headers, data=payload)
-        access_token = r.json()["access_token"]
-        return {"access_token": access_token}
 
     @endpoint(
         methods=["get"],
@@ -74,15 +1159,36 @@ class KeycloakConnector(BaseResource):
             "realm": {
                 "description": "Tenant Keycloak/Collectivité",
                 "example_value": "imio",
-            }
+            },
+            "first": {
+                "description": "Index du premier utilisateur retourné (pagination)",
+                "example_value": "0",
+            },
+            "max": {
+                "description": "Nombre maximum d'utilisateurs retournés (pagination)",
+                "example_value": "100",
+            },
+            "q": {
+                "description": "Recherche sur le nom d'utilisateur, le prénom, le nom ou l'adresse mail",
+                "example_value": "modesto",
+            },
         }
     )
-    def get_users(self, request, realm):
-        url = f"{self.url}admin/realms/{realm}/users?max={self.MAX_RESULTS}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+    @instrumented
+    def get_users(self, request, realm, first=None, max=None, q=None):
+        params = {}
+        if q:
+            params["search"] = q
+        if first is not None or max is not None:
+            # pagination demandée par le client : une seule page
+            params["first"] = self._int_parameter("first", first, 0)
+            params["max"] = self._int_parameter("max", max, self.PAGE_SIZE)
+            r = self._request("get", f"admin/realms/{realm}/users", params=params)
+            r.raise_for_status()
+            return {"data": self._json(r)}
+        if q or not self.cache_ttl:
+            return self._stream_data(self._iter_pages(f"admin/realms/{realm}/users", params))
+        return self._stream_data(self.get_snapshot(realm, "users"))
 
     @endpoint(
         methods=["get"],
@@ -100,15 +1206,16 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
-            }
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
         }
     )
-    def get_user_groups(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/groups"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+    @instrumented
+    def get_user_groups(self, request, realm, user_id, cache=None):
+        return {"data": self._cached_get(realm, f"admin/realms/{realm}/users/{user_id}/groups", "user-groups", use_cache=cache)}
 
     @endpoint(
         methods=["get"],
@@ -126,15 +1233,16 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
-            }
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
         }
     )
-    def get_user_credentials(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/credentials"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+    @instrumented
+    def get_user_credentials(self, request, realm, user_id, cache=None):
+        return {"data": self._cached_get(realm, f"admin/realms/{realm}/users/{user_id}/credentials", "credentials", use_cache=cache)}
 
     @endpoint(
         methods=["delete"],
@@ -156,15 +1264,18 @@ class KeycloakConnector(BaseResource):
             "credential_id": {
                 "description": "GUID du credential",
                 "example_value": "98e95a9c-236d-4d1b-af70-e90a95248ecc",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def delete_user_credential(self, request, realm, user_id, credential_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/credentials/{credential_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.delete(url=url, headers=headers)
-        r.raise_for_status()
+    @instrumented
+    def delete_user_credential(self, request, realm, user_id, credential_id, mode=None):
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "remove-credential", credential_id)
+        self._delete_user_credential(realm, user_id, credential_id)
 
     @endpoint(
         methods=["post"],
@@ -182,20 +1293,19 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def update_user(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {
-            "Authorization": "Bearer " + token,
-            "Content-type": "application/json"
-        }
-        data = json.loads(request.body)
-        data = {key: value for key, value in data.items() if value is not None}
-        r = requests.put(url=url, headers=headers, data=json.dumps(data))
-        r.raise_for_status()
+    @instrumented
+    def update_user(self, request, realm, user_id, mode=None):
+        data = fastjson.loads(request.body)
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "update", data=data)
+        self._update_user(realm, user_id, data)
 
     @endpoint(
         methods=["post"],
@@ -212,6 +1322,7 @@ class KeycloakConnector(BaseResource):
             }
         }
     )
+    @instrumented
     def create_user(self, request, realm):
         """
             "username": "drstranger@marvel.com",
@@ -221,11 +1332,7 @@ class KeycloakConnector(BaseResource):
             "lastName": "Strange",
             "email": "drstranger@marvel.com"
         """
-        url = f"{self.url}admin/realms/{realm}/users"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.post(url=url, headers=headers, data=request.body)
-        r.raise_for_status()
+        self._create_user(realm, fastjson.loads(request.body))
 
     @endpoint(
         methods=["get"],
@@ -246,12 +1353,109 @@ class KeycloakConnector(BaseResource):
             }
         }
     )
+    @instrumented
     def get_user_by_mail(self, request, realm, email):
-        url = f"{self.url}admin/realms/{realm}/users?email={email}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+        users = self.lookup_local_users(realm, email=email)
+        if users:
+            return {"data": users}
+        # correspondance exacte, comme la recherche dans la table locale
+        r = self._request("get", f"admin/realms/{realm}/users", params={"email": email, "exact": "true"})
+        return {"data": self._json(r)}
+
+    @endpoint(
+        methods=["get"],
+        name="users-datasource",
+        perm='can_access',
+        description="Source de données w.c.s. des utilisateurs d'un realm",
+        long_description=(
+            "Utilisateurs au format {id, text} ; q recherche dans le nom d'utilisateur, l'adresse mail, "
+            "le prénom et le nom (sans tenir compte des accents ni de la casse), id retourne un seul utilisateur."
+        ),
+        display_order=11,
+        display_category="User",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
+            },
+            "q": {
+                "description": "Texte recherché",
+                "example_value": "modesto",
+            },
+            "id": {
+                "description": "GUID de l'utilisateur",
+                "example_value": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
+            },
+            "limit": {
+                "description": "Nombre maximum de résultats",
+                "example_value": "20",
+            },
+        }
+    )
+    @instrumented
+    def users_datasource(self, request, realm, q=None, id=None, limit=None):
+        limit = self._int_parameter("limit", limit, self.DATASOURCE_LIMIT) if not id else 1
+        users = self.search_local_users(realm, q=q, user_id=id, limit=limit)
+        if id and not users:
+            # realm pas encore copié localement, ou utilisateur créé depuis la
+            # dernière synchronisation : demandé à Keycloak
+            users = [user for user in [self._fetch_user(realm, id)] if user]
+        elif users is None:
+            # realm pas encore copié localement : recherche par Keycloak
+            params = {"max": limit, "briefRepresentation": "true"}
+            if q:
+                params["search"] = q
+            r = self._request("get", f"admin/realms/{realm}/users", params=params)
+            r.raise_for_status()
+            users = self._json(r)
+        return {"data": [self._user_item(user) for user in users]}
+
+    def _user_item(self, user):
+        name = " ".join(filter(None, [user.get("firstName"), user.get("lastName")]))
+        text = f"{name} ({user.get('email')})" if name and user.get("email") else name or user.get("username")
+        item = {"id": user.get("id"), "text": text}
+        item.update((field, user.get(field)) for field in ("username", "email", "firstName", "lastName"))
+        return item
+
+    @endpoint(
+        methods=["get"],
+        name="groups-datasource",
+        perm='can_access',
+        description="Source de données w.c.s. des groupes d'un realm",
+        long_description=(
+            "Groupes (sous-groupes compris) au format {id, text} où text est le chemin du groupe ; "
+            "q recherche dans les chemins, id retourne un seul groupe (GUID ou chemin)."
+        ),
+        display_order=7,
+        display_category="Group",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
+            },
+            "q": {
+                "description": "Texte recherché",
+                "example_value": "agents",
+            },
+            "id": {
+                "description": "GUID ou chemin du groupe",
+                "example_value": "ab220bdb-a4b7-4090-b631-0c6abea09293",
+            },
+            "limit": {
+                "description": "Nombre maximum de résultats",
+                "example_value": "20",
+            },
+        }
+    )
+    @instrumented
+    def groups_datasource(self, request, realm, q=None, id=None, limit=None):
+        tree = self.get_group_tree(realm)
+        if id:
+            groups = [group for group in [tree.get(id)] if group]
+        else:
+            limit = self._int_parameter("limit", limit, self.DATASOURCE_LIMIT)
+            groups = tree.search(q)[:limit]
+        return {"data": [{"id": g["id"], "text": g["path"], "name": g.get("name")} for g in groups]}
 
     @endpoint(
         methods=["get"],
@@ -270,12 +1474,9 @@ class KeycloakConnector(BaseResource):
             }
         }
     )
+    @instrumented
     def get_groups(self, request, realm):
-        url = f"{self.url}admin/realms/{realm}/groups"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+        return {"data": self.get_snapshot(realm, "groups")}
 
     @endpoint(
         # Méthode à revoir, ticket EO envoyé
@@ -294,17 +1495,18 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "c034662e-56a4-4dec-8ebd-ecf2bb75d3e7",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def delete_user(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {
-            "Authorization": "Bearer " + token        
-            }
-        r = requests.delete(url=url, headers=headers)
-        r.raise_for_status()
+    @instrumented
+    def delete_user(self, request, realm, user_id, mode=None):
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "delete")
+        self._delete_user(realm, user_id)
 
     @endpoint(
         methods=["post"],
@@ -326,23 +1528,24 @@ class KeycloakConnector(BaseResource):
             "provider_id": {
                 "description": "ID du fournisseur",
                 "example_value": "imio",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def create_idp_link(self, request, realm, user_id, provider_id):
+    @instrumented
+    def create_idp_link(self, request, realm, user_id, provider_id, mode=None):
         """
             "identityProvider": "imio",
             "userId": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
             "userName": "drstranger@marvel.com"
         """
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/federated-identity/{provider_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {
-            "Authorization": "Bearer " + token,
-            "Content-Type": "application/json"
-        }
-        r = requests.post(url=url, headers=headers, data=request.body)
-        r.raise_for_status()
+        data = fastjson.loads(request.body)
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "add-idp-link", provider_id, data)
+        self._create_idp_link(realm, user_id, provider_id, data)
 
     @endpoint(
         methods=["get"],
@@ -360,15 +1563,16 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "97cf8f01-fa69-4143-9836-b69765d8d5d3",
-            }
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
         }
     )
-    def read_idp_links(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/federated-identity"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+    @instrumented
+    def read_idp_links(self, request, realm, user_id, cache=None):
+        return {"data": self._cached_get(realm, f"admin/realms/{realm}/users/{user_id}/federated-identity", "idp-links", use_cache=cache)}
 
     @endpoint(
         methods=["delete"],
@@ -390,15 +1594,18 @@ class KeycloakConnector(BaseResource):
             "provider_id": {
                 "description": "ID du fournisseur",
                 "example_value": "pltest1",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def delete_idp_link(self, request, realm, user_id, provider_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/federated-identity/{provider_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.delete(url=url, headers=headers)
-        r.raise_for_status()
+    @instrumented
+    def delete_idp_link(self, request, realm, user_id, provider_id, mode=None):
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "remove-idp-link", provider_id)
+        self._delete_idp_link(realm, user_id, provider_id)
 
     @endpoint(
         methods=["get"],
@@ -416,15 +1623,16 @@ class KeycloakConnector(BaseResource):
             "user_id": {
                 "description": "GUID de l'utilisateur",
                 "example_value": "8c733129-bdbb-4268-a54e-6de65512cede",
-            }
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
         }
     )
-    def read_user_group(self, request, realm, user_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/groups"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
+    @instrumented
+    def read_user_group(self, request, realm, user_id, cache=None):
+        return {"data": self._cached_get(realm, f"admin/realms/{realm}/users/{user_id}/groups", "user-groups", use_cache=cache)}
 
     @endpoint(
         # Fonctionne avec get (IT) mais on test ça côté TS avec un post
@@ -447,15 +1655,18 @@ class KeycloakConnector(BaseResource):
             "group_id": {
                 "description": "GUID du groupe",
                 "example_value": "ab220bdb-a4b7-4090-b631-0c6abea09293",
-            }
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
         }
     )
-    def add_user_group(self, request, realm, user_id, group_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/groups/{group_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.put(url=url, headers=headers)
-        r.raise_for_status()
+    @instrumented
+    def add_user_group(self, request, realm, user_id, group_id, mode=None):
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "add-group", group_id)
+        self._add_user_group(realm, user_id, group_id)
 
     @endpoint(
         methods=["get"], 
@@ -477,15 +1688,146 @@ class KeycloakConnector(BaseResource):
             "group_id": {
                 "description": "GUID du groupe",
                 "example_value": "ab220bdb-a4b7-4090-b631-0c6abea09293",
+            },
+            "mode": {
+                "description": "« async » pour différer la modification (état : mutation-status)",
+                "example_value": "async",
+            },
+        }
+    )
+    @instrumented
+    def delete_user_group(self, request, realm, user_id, group_id, mode=None):
+        if mode == "async":
+            return self._defer_mutation(request, realm, user_id, "remove-group", group_id)
+        self._delete_user_group(realm, user_id, group_id)
+
+    @endpoint(
+        methods=["post"],
+        name="bulk-users",
+        perm='can_access',
+        description="Créer, modifier ou supprimer des utilisateurs par lot",
+        long_description=(
+            "Le corps de la requête est une liste JSON (ou un flux NDJSON) d'opérations "
+            '{"op": "create|update|delete|add-group|remove-group|add-idp-link|remove-idp-link|remove-credential", '
+            '"user_id": ..., "group_id": ..., "provider_id": ..., "credential_id": ..., "data": {...}}. '
+            "Les opérations d'un même utilisateur sont appliquées dans l'ordre, les autres en parallèle ; "
+            "un échec n'interrompt pas le lot."
+        ),
+        display_order=9,
+        display_category="User",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
             }
         }
     )
-    def delete_user_group(self, request, realm, user_id, group_id):
-        url = f"{self.url}admin/realms/{realm}/users/{user_id}/groups/{group_id}"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.delete(url=url, headers=headers)
-        r.raise_for_status()
+    @instrumented
+    def bulk_users(self, request, realm):
+        operations = self._parse_operations(request)
+
+        # une file d'opérations par utilisateur, les files sont traitées en parallèle
+        queues = {}
+        for index, operation in enumerate(operations):
+            user_id = operation.get("user_id") if isinstance(operation, dict) else None
+            if not isinstance(user_id, str):
+                # opération invalide ou création : file à part, l'erreur est signalée dans son résultat
+                user_id = None
+            queues.setdefault(user_id or f"#{index}", []).append((index, operation))
+
+        def run_queue(queue):
+            return [self._run_user_operation(realm, index, operation) for index, operation in queue]
+
+        results = sorted(
+            itertools.chain.from_iterable(self._parallel_map(run_queue, queues.values())),
+            key=lambda result: result["index"],
+        )
+        return {
+            "data": results,
+            "meta": {
+                "realm": realm,
+                "total": len(results),
+                "errors": sum(1 for result in results if result["err"]),
+            },
+        }
+
+    @endpoint(
+        methods=["get", "post"],
+        name="read-users-details",
+        perm='can_access',
+        description="Récupérer groupes, types de connexion et liens IdP de plusieurs utilisateurs",
+        long_description=(
+            "Équivalent de read-user-groups, read-user-credentials et get-idp-link pour une liste "
+            "d'utilisateurs (paramètre user_ids, ou liste JSON de GUID en POST) : toutes les "
+            "sous-ressources sont demandées en parallèle et fusionnées en un document par utilisateur."
+        ),
+        display_order=10,
+        display_category="User",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
+            },
+            "user_ids": {
+                "description": "GUID des utilisateurs, séparés par des virgules",
+                "example_value": "4d49f2eb-890d-47e9-8cb4-3910fc17b66b",
+            },
+            "include": {
+                "description": "Sous-ressources retournées, parmi groups, credentials et idp_links",
+                "example_value": "groups,credentials,idp_links",
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
+        }
+    )
+    @instrumented
+    def read_users_details(self, request, realm, user_ids=None, include=None, cache=None):
+        if request.method == "POST":
+            try:
+                user_ids = fastjson.loads(request.body)
+            except ValueError as e:
+                raise APIError(f"JSON invalide : {e}", http_status=400)
+            if not isinstance(user_ids, list):
+                raise APIError("une liste de GUID est attendue", http_status=400)
+        else:
+            user_ids = (user_ids or "").split(",")
+        user_ids = list(dict.fromkeys(str(user_id).strip() for user_id in user_ids if str(user_id).strip()))
+        if not user_ids:
+            raise APIError("user_ids manquant", http_status=400)
+        if len(user_ids) > self.MAX_DETAILS_USERS:
+            raise APIError(f"au plus {self.MAX_DETAILS_USERS} utilisateurs", http_status=400)
+        include = [name.strip() for name in include.split(",") if name.strip()] if include else list(self.USER_DETAILS)
+        unknown = [name for name in include if name not in self.USER_DETAILS]
+        if unknown:
+            raise APIError(f"include inconnu : {', '.join(unknown)}", http_status=400)
+
+        def fetch(item):
+            user_id, name = item
+            path, kind = self.USER_DETAILS[name]
+            try:
+                url = f"admin/realms/{realm}/users/{user_id}/{path}"
+                return self._cached_get(realm, url, kind, use_cache=cache, raise_errors=True), None
+            except (requests.RequestException, ValueError) as e:
+                # réponse en erreur ou illisible : seul cet utilisateur est en erreur
+                return None, str(e)
+
+        items = [(user_id, name) for user_id in user_ids for name in include]
+        details = {user_id: {"id": user_id, "err": 0} for user_id in user_ids}
+        for (user_id, name), (data, error) in zip(items, self._parallel_map(fetch, items)):
+            if error:
+                details[user_id]["err"] = 1
+                details[user_id].setdefault("errors", {})[name] = error
+            details[user_id][name] = data
+        return {
+            "data": list(details.values()),
+            "meta": {
+                "realm": realm,
+                "total": len(details),
+                "errors": sum(1 for detail in details.values() if detail["err"]),
+            },
+        }
 
     @endpoint(
         methods=["get"],
@@ -503,16 +1845,103 @@ class KeycloakConnector(BaseResource):
             "group_id": {
                 "description": "GUID du groupe",
                 "example_value": "ab220bdb-a4b7-4090-b631-0c6abea09293",
-            }
+            },
+            "cache": {
+                "description": "Mettre « false » pour ignorer le cache de réponses",
+                "example_value": "true",
+            },
         }
     )
-    def read_groups_members(self, request, realm, group_id):
-        url = f"{self.url}admin/realms/{realm}/groups/{group_id}/members"
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
-        r = requests.get(url=url, headers=headers)
-        return {"data": r.json()}
-    
+    @instrumented
+    def read_groups_members(self, request, realm, group_id, cache=None):
+        return {"data": self._cached_get(realm, f"admin/realms/{realm}/groups/{group_id}/members", "group-members", use_cache=cache)}
+
+    @endpoint(
+        methods=["post"],
+        name="sync-group-members",
+        perm='can_access',
+        description="Synchroniser les membres d'un ou plusieurs groupes",
+        long_description=(
+            "Le corps de la requête donne la liste complète des membres attendus : une liste de GUID "
+            "d'utilisateurs si group_id est renseigné, sinon un dictionnaire {GUID du groupe: [GUID, ...]}. "
+            "Seuls les ajouts et retraits nécessaires sont envoyés à Keycloak."
+        ),
+        display_order=6,
+        display_category="Group",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
+            },
+            "group_id": {
+                "description": "GUID du groupe",
+                "example_value": "ab220bdb-a4b7-4090-b631-0c6abea09293",
+            },
+            "dry_run": {
+                "description": "Mettre « false » pour appliquer les changements (toute autre valeur : simulation)",
+                "example_value": "false",
+            },
+        }
+    )
+    @instrumented
+    def sync_group_members(self, request, realm, group_id=None, dry_run=None):
+        dry_run = self._dry_run_parameter(dry_run)
+        try:
+            desired = fastjson.loads(request.body)
+        except ValueError as e:
+            raise APIError(f"JSON invalide : {e}", http_status=400)
+        if group_id:
+            desired = {group_id: desired}
+        if not isinstance(desired, dict) or not all(isinstance(v, list) for v in desired.values()):
+            raise APIError("membres attendus invalides", http_status=400)
+
+        def get_member_ids(group_id):
+            return {
+                m["id"]
+                for m in self._iter_pages(
+                    f"admin/realms/{realm}/groups/{group_id}/members", {"briefRepresentation": "true"}
+                )
+                if m.get("id")
+            }
+
+        group_ids = list(desired)
+        results = {}
+        changes = []
+        for group_id, current in zip(group_ids, self._parallel_map(get_member_ids, group_ids)):
+            wanted = set(desired[group_id])
+            added = sorted(wanted - current)
+            removed = sorted(current - wanted)
+            results[group_id] = {"group_id": group_id, "added": added, "removed": removed, "errors": []}
+            changes.extend(("put", group_id, user_id) for user_id in added)
+            changes.extend(("delete", group_id, user_id) for user_id in removed)
+
+        if changes and not dry_run:
+
+            def apply(change):
+                method, group_id, user_id = change
+                try:
+                    r = self._request(method, f"admin/realms/{realm}/users/{user_id}/groups/{group_id}")
+                    r.raise_for_status()
+                except requests.RequestException as e:
+                    return {"user_id": user_id, "op": method, "err_desc": str(e)}
+
+            for (method, group_id, user_id), error in zip(changes, self._parallel_map(apply, changes)):
+                if error:
+                    results[group_id]["errors"].append(error)
+            self.invalidate_snapshot(realm, "members")
+
+        data = [results[group_id] for group_id in group_ids]
+        return {
+            "data": data,
+            "meta": {
+                "realm": realm,
+                "dry_run": dry_run,
+                "added": sum(len(result["added"]) for result in data),
+                "removed": sum(len(result["removed"]) for result in data),
+                "errors": sum(len(result["errors"]) for result in data),
+            },
+        }
+
     @endpoint(
         methods=["get"],
         name="realm-users-groups-aggregated",
@@ -525,71 +1954,845 @@ class KeycloakConnector(BaseResource):
             "realm": {
                 "description": "Tenant Keycloak/Collectivité",
                 "example_value": "imio",
-            }
+            },
+            "enabled": {
+                "description": "Uniquement les utilisateurs actifs (true) ou inactifs (false)",
+                "example_value": "true",
+            },
+            "group": {
+                "description": "GUID ou chemin d'un groupe : uniquement ses membres et ceux de ses sous-groupes",
+                "example_value": "/agents",
+            },
+            "search": {
+                "description": "Recherche sur le nom d'utilisateur, le prénom, le nom ou l'adresse mail",
+                "example_value": "modesto",
+            },
+            "email_domain": {
+                "description": "Uniquement les adresses mail de ce domaine",
+                "example_value": "imio.be",
+            },
+            "fields": {
+                "description": "Champs retournés pour chaque utilisateur, séparés par des virgules",
+                "example_value": "id,email,groups",
+            },
+            "inherited": {
+                "description": "Inclure les groupes parents des groupes de l'utilisateur",
+                "example_value": "false",
+            },
+            "mode": {
+                "description": "« async » : lancer un export en tâche de fond et retourner son identifiant",
+                "example_value": "async",
+            },
+            "export_format": {
+                "description": "Format de l'export en tâche de fond : json, ndjson ou csv",
+                "example_value": "json",
+            },
+            "since": {
+                "description": "Version (meta.version ou ETag) d'une réponse précédente : uniquement les "
+                "utilisateurs ajoutés, modifiés (groupes compris) et supprimés depuis",
+                "example_value": "4f1c2b9a0d8e7f6a5b4c3d2e",
+            },
         }
     )
-    def realm_users_groups_aggregated(self, request, realm):
-        token = self.access_token(request)["access_token"]
-        headers = {"Authorization": "Bearer " + token}
+    @instrumented
+    def realm_users_groups_aggregated(
+        self, request, realm, enabled=None, group=None, search=None, email_domain=None, fields=None,
+        inherited=None, mode=None, export_format=None, since=None,
+    ):
+        filters = {
+            "enabled": enabled,
+            "group": group,
+            "search": search,
+            "email_domain": email_domain,
+            "fields": fields,
+            "inherited": inherited,
+        }
+        if mode == "async":
+            export_format = export_format or "json"
+            if export_format not in RealmExport.FORMATS:
+                raise APIError(f"format inconnu : {export_format}", http_status=400)
+            export = RealmExport.objects.create(resource=self, realm=realm, params=filters, format=export_format)
+            self.add_job("run_realm_export", export_id=export.pk)
+            return {"data": export.get_status(request)}
+        result = self.aggregate_realm(realm, **filters)
+        meta = result["meta"]
+        if fields and "id" not in [field.strip() for field in fields.split(",")]:
+            # sans GUID, pas de version
+            return self._stream_data(result["data"], meta=meta)
 
-        #  Récupérer tous les users du realm
-        users_url = f"{self.url}admin/realms/{realm}/users?max={self.MAX_RESULTS}"
-        r_users = requests.get(url=users_url, headers=headers)
-        r_users.raise_for_status()
-        users = r_users.json() or []
-        users_by_id = {u.get("id"): u for u in users if u.get("id")}
+        params_key = fastjson.dumps([realm, sorted(filters.items())])
+        if_none_match = [
+            # W/"version" ou "version"
+            etag.strip().split("W/")[-1].strip('"') for etag in request.headers.get("If-None-Match", "").split(",")
+        ]
+        if not since and not any(if_none_match):
+            # réponse complète produite au fil de l'eau, la version est
+            # calculée en même temps et retournée dans meta
+            def versioned(users):
+                digests = {}
+                for user in users:
+                    digests[user["id"]] = aggregation.user_digest(user)
+                    yield user
+                meta["version"] = self._store_aggregated_version(realm, params_key, digests)
 
-        #  Récupérer tous les groupes du realm
-        groups_url = f"{self.url}admin/realms/{realm}/groups"
-        r_groups = requests.get(url=groups_url, headers=headers)
-        r_groups.raise_for_status()
-        groups = r_groups.json() or []
+            return self._stream_data(versioned(result["data"]), meta=meta)
 
-        #  Récupérer les membres de chaque groupe, puis faire user_id -> groupes
-        user_groups = {}
+        previous = None
+        if since:
+            previous = self.aggregated_versions.filter(realm=realm, params_key=params_key, version=since).first()
+            if previous is None:
+                raise APIError("version inconnue ou expirée, relire la réponse complète", http_status=410)
+        # seuls les utilisateurs à retourner sont conservés : tous si la
+        # réponse est complète, les ajoutés et modifiés si since
+        digests, users = {}, []
+        for user in result["data"]:
+            digest = digests[user["id"]] = aggregation.user_digest(user)
+            if previous is None or previous.digests.get(user["id"]) != digest:
+                users.append(user)
+        version = self._store_aggregated_version(realm, params_key, digests)
+        if version in if_none_match:
+            response = HttpResponse(status=304)
+        elif previous is not None:
+            meta.update(version=version, since=since)
+            response = HttpResponse(
+                fastjson.dumps({"err": 0, "data": aggregation.delta(previous.digests, digests, users), "meta": meta}),
+                content_type="application/json",
+            )
+        else:
+            response = self._stream_data(users, meta=dict(meta, version=version))
+        response["ETag"] = f'"{version}"'
+        return response
 
-        for g in groups:
-            group_id = g.get("id")
-            if not group_id:
-                continue
+    def _store_aggregated_version(self, realm, params_key, digests):
+        version = aggregation.version(params_key, digests)
+        _, created = AggregatedVersion.objects.get_or_create(
+            resource=self, realm=realm, params_key=params_key, version=version, defaults={"digests": digests}
+        )
+        if created:
+            stale = self.aggregated_versions.filter(realm=realm, params_key=params_key).order_by("-created")[
+                self.AGGREGATED_VERSIONS_KEPT:
+            ]
+            AggregatedVersion.objects.filter(pk__in=list(stale.values_list("pk", flat=True))).delete()
+        return version
 
-            group_info = {"id": group_id, "name": g.get("name")}
+    def aggregate_realm(
+        self, realm, enabled=None, group=None, search=None, email_domain=None, fields=None, inherited=None,
+        progress=None,
+    ):
+        """
+        Utilisateurs d'un realm avec leurs groupes, voir realm-users-groups-aggregated ;
+        data est un générateur et progress(users=..., groups=...) est appelé au
+        fil de l'avancement.
+        """
+        if enabled not in (None, ""):
+            enabled = self._bool_parameter(enabled)
+        else:
+            enabled = None
+        fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else self.AGGREGATED_FIELDS
+        email_domain = email_domain.strip().lstrip("@").lower() if email_domain else None
+        cached_users = self.cached_snapshot(realm, "users")
 
-            members_url = f"{self.url}admin/realms/{realm}/groups/{group_id}/members?max={self.MAX_RESULTS}"
-            r_members = requests.get(url=members_url, headers=headers)
-            r_members.raise_for_status()
-            members = r_members.json() or []
+        #  Récupérer tous les groupes du realm (sous-groupes compris), ou le sous-arbre demandé
+        tree = self.get_group_tree(realm)
+        groups = list(tree)
+        if group:
+            groups = tree.subtree(group)
+            if not groups:
+                raise APIError(f"groupe inconnu : {group}", http_status=404)
 
-            for m in members:
-                guid = m.get("id")
-                if not guid:
-                    continue
-                # join uniquement si l'user existe côté liste users
-                if guid not in users_by_id:
-                    continue
+        #  Récupérer les users du realm, en laissant Keycloak filtrer si possible
+        members = None
+        if group and cached_users is None:
+            # les membres sont récupérés avec leur représentation complète
+            # et servent directement de liste d'utilisateurs
+            members, users = self._fetch_members_with_users(realm, groups)
+        elif cached_users is not None:
+            users = cached_users
+        elif enabled is None and not search and not email_domain:
+            users = self.get_snapshot(realm, "users")
+        else:
+            params = {}
+            if search:
+                params["search"] = search
+            if email_domain:
+                params["email"] = f"@{email_domain}"
+            if enabled is not None:
+                params["enabled"] = "true" if enabled else "false"
+            users = self._iter_pages(f"admin/realms/{realm}/users", params)
+        records = aggregation.compact_users(
+            users, fields, lambda u: self._match_user(u, enabled, search, email_domain)
+        )
+        # seules les versions compactes des utilisateurs sont conservées
+        del users, cached_users
 
-                if guid not in user_groups:
-                    user_groups[guid] = []
-                user_groups[guid].append(group_info)
-
-        #  Matcher les users avec leurs groupes
-        matched_users = []
-        for guid, u in users_by_id.items():
-            matched_users.append({
-                "id": guid,
-                "username": u.get("username"),
-                "firstName": u.get("firstName"),
-                "lastName": u.get("lastName"),
-                "email": u.get("email"),
-                "enabled": u.get("enabled"),
-                "groups": user_groups.get(guid, []),
-            })
+        #  Récupérer les membres de chaque groupe, puis faire user_id -> groupes
+        all_members = None
+        if "groups" in fields:
+            # group restreint les utilisateurs retournés, pas leurs groupes :
+            # les appartenances hors du sous-arbre sont aussi listées
+            all_members = self.get_snapshot(realm, "members", groups=list(tree))
+        if group:
+            if members is None and all_members is not None:
+                members = {g["id"]: all_members.get(g["id"], []) for g in groups if g.get("id")}
+            elif members is None:
+                members = self._subtree_members(realm, groups)
+            group_member_ids = set(itertools.chain.from_iterable(members.values()))
+            records = {guid: values for guid, values in records.items() if guid in group_member_ids}
+        if all_members is not None:
+            tree.set_members(all_members)
+        del members, all_members
+        if progress:
+            progress(groups=len(groups))
 
+        #  Matcher les users avec leurs groupes, au fil de la sortie
         return {
-            "data": matched_users,
+            "data": aggregation.iter_aggregated(records, fields, tree, self._bool_parameter(inherited), progress),
             "meta": {
                 "realm": realm,
-                "users_total": len(users),
+                "users_total": len(records),
                 "groups_total": len(groups),
             },
         }
+
+    @endpoint(
+        methods=["get"],
+        name="realms-users-groups-aggregated",
+        perm="can_access",
+        description="Agrège users + groupes de plusieurs realms",
+        long_description=(
+            "Comme realm-users-groups-aggregated pour plusieurs realms traités en parallèle ; "
+            "la réponse est un flux NDJSON d'une ligne par realm, dans l'ordre où ils se terminent."
+        ),
+        display_order=4,
+        display_category="Combo",
+        parameters={
+            "realms": {
+                "description": "Realms séparés par des virgules ; par défaut tous les realms visibles sauf master",
+                "example_value": "imio,liege",
+            },
+            "enabled": {
+                "description": "Uniquement les utilisateurs actifs (true) ou inactifs (false)",
+                "example_value": "true",
+            },
+            "search": {
+                "description": "Recherche sur le nom d'utilisateur, le prénom, le nom ou l'adresse mail",
+                "example_value": "modesto",
+            },
+            "email_domain": {
+                "description": "Uniquement les adresses mail de ce domaine",
+                "example_value": "imio.be",
+            },
+            "fields": {
+                "description": "Champs retournés pour chaque utilisateur, séparés par des virgules",
+                "example_value": "id,email,groups",
+            },
+            "inherited": {
+                "description": "Inclure les groupes parents des groupes de l'utilisateur",
+                "example_value": "false",
+            },
+        }
+    )
+    @instrumented
+    def realms_users_groups_aggregated(
+        self, request, realms=None, enabled=None, search=None, email_domain=None, fields=None, inherited=None
+    ):
+        if realms:
+            realms = [realm.strip() for realm in realms.split(",") if realm.strip()]
+        else:
+            r = self._request("get", "admin/realms", params={"briefRepresentation": "true"})
+            r.raise_for_status()
+            realms = [realm["realm"] for realm in self._json(r) if realm.get("realm") != "master"]
+        filters = {
+            "enabled": enabled,
+            "search": search,
+            "email_domain": email_domain,
+            "fields": fields,
+            "inherited": inherited,
+        }
+
+        def aggregate(realm):
+            result = self.aggregate_realm(realm, **filters)
+            # sérialisé dans le thread du realm
+            return fastjson.dumps({"realm": realm, "err": 0, "data": list(result["data"]), "meta": result["meta"]})
+
+        def content():
+            for realm, line in self._as_completed_map(aggregate, realms):
+                if isinstance(line, Exception):
+                    line = fastjson.dumps({"realm": realm, "err": 1, "err_desc": str(line)})
+                yield line + "\n"
+
+        return StreamingHttpResponse(content(), content_type="application/x-ndjson")
+
+    def run_realm_export(self, export_id):
+        export = RealmExport.objects.get(pk=export_id, resource=self)
+        export.status = "running"
+        export.save(update_fields=["status"])
+
+        def progress(**kwargs):
+            export.progress.update(kwargs)
+            RealmExport.objects.filter(pk=export.pk).update(progress=export.progress)
+
+        try:
+            result = self.aggregate_realm(export.realm, progress=progress, **export.params)
+            export.write(result)
+            progress(users=result["meta"]["users_total"])
+        except Exception as e:
+            export.status = "failed"
+            export.error = str(e)
+            export.save(update_fields=["status", "error"])
+            if isinstance(e, (requests.RequestException, APIError)):
+                return
+            raise
+        export.status = "completed"
+        export.completed = now()
+        export.save(update_fields=["status", "completed"])
+
+    @endpoint(
+        methods=["get"],
+        name="export-status",
+        perm="can_access",
+        description="État d'un export en tâche de fond",
+        long_description="État et avancement (utilisateurs et groupes traités) d'un export lancé avec mode=async",
+        display_order=2,
+        display_category="Combo",
+        parameters={
+            "id": {
+                "description": "Identifiant de l'export",
+                "example_value": "0f6a4b2e-7a51-4b5c-9f0a-3c1f2d9e8b7a",
+            }
+        }
+    )
+    @instrumented
+    def export_status(self, request, id):
+        return {"data": self._get_export(id).get_status(request)}
+
+    @endpoint(
+        methods=["get"],
+        name="export-download",
+        perm="can_access",
+        description="Télécharger le résultat d'un export en tâche de fond",
+        long_description="Télécharger le résultat d'un export terminé (compressé en gzip pour le transfert)",
+        display_order=3,
+        display_category="Combo",
+        parameters={
+            "id": {
+                "description": "Identifiant de l'export",
+                "example_value": "0f6a4b2e-7a51-4b5c-9f0a-3c1f2d9e8b7a",
+            }
+        }
+    )
+    @instrumented
+    def export_download(self, request, id):
+        export = self._get_export(id)
+        if export.status != "completed":
+            raise APIError(f"export non disponible ({export.status})", http_status=409)
+        content_type, extension = RealmExport.FORMATS[export.format]
+        response = FileResponse(export.content.open("rb"), content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+        response["Content-Disposition"] = f'attachment; filename="{export.realm}-{export.uuid}.{extension}"'
+        return response
+
+    def _get_export(self, export_id):
+        try:
+            return self.exports.get(uuid=export_id)
+        except (RealmExport.DoesNotExist, ValidationError):
+            raise APIError("export inconnu", http_status=404)
+
+    @endpoint(
+        methods=["post"],
+        name="bulk-credentials-cleanup",
+        perm='can_access',
+        description="Supprimer un type de connexion ou un lien IdP de tous les utilisateurs sélectionnés",
+        long_description=(
+            "Supprime les credentials du type credential_type ou les liens d'identité du fournisseur "
+            "provider_id des utilisateurs sélectionnés (tous par défaut, ou selon group, search, "
+            "email_domain et enabled), en parallèle. La réponse est un flux NDJSON : une ligne par "
+            "utilisateur concerné, au fur et à mesure, puis une ligne de synthèse. Par défaut rien n'est "
+            "supprimé (dry_run)."
+        ),
+        display_order=12,
+        display_category="User",
+        parameters={
+            "realm": {
+                "description": "Tenant Keycloak/Collectivité",
+                "example_value": "imio",
+            },
+            "credential_type": {
+                "description": "Type de credential à supprimer",
+                "example_value": "otp",
+            },
+            "provider_id": {
+                "description": "ID du fournisseur dont les liens d'identité sont à supprimer",
+                "example_value": "imio",
+            },
+            "group": {
+                "description": "GUID ou chemin d'un groupe : uniquement ses membres et ceux de ses sous-groupes",
+                "example_value": "/agents",
+            },
+            "search": {
+                "description": "Recherche sur le nom d'utilisateur, le prénom, le nom ou l'adresse mail",
+                "example_value": "modesto",
+            },
+            "email_domain": {
+                "description": "Uniquement les adresses mail de ce domaine",
+                "example_value": "imio.be",
+            },
+            "enabled": {
+                "description": "Uniquement les utilisateurs actifs (true) ou inactifs (false)",
+                "example_value": "true",
+            },
+            "dry_run": {
+                "description": "Mettre « false » pour effectuer les suppressions (toute autre valeur : simulation)",
+                "example_value": "true",
+            },
+        }
+    )
+    @instrumented
+    def bulk_credentials_cleanup(
+        self, request, realm, credential_type=None, provider_id=None, group=None, search=None,
+        email_domain=None, enabled=None, dry_run=None,
+    ):
+        if bool(credential_type) == bool(provider_id):
+            raise APIError("renseigner credential_type ou provider_id", http_status=400)
+        dry_run = self._dry_run_parameter(dry_run)
+        result = self.aggregate_realm(
+            realm, enabled=enabled, group=group, search=search, email_domain=email_domain, fields="id,username"
+        )
+        users = list(result["data"])
+
+        def cleanup(user):
+            user_id = user["id"]
+            if credential_type:
+                r = self._request("get", f"admin/realms/{realm}/users/{user_id}/credentials")
+                r.raise_for_status()
+                matched = [c["id"] for c in self._json(r) if c.get("type") == credential_type]
+                delete = self._delete_user_credential
+            else:
+                r = self._request("get", f"admin/realms/{realm}/users/{user_id}/federated-identity")
+                r.raise_for_status()
+                matched = [
+                    link["identityProvider"] for link in self._json(r) if link.get("identityProvider") == provider_id
+                ]
+                delete = self._delete_idp_link
+            if not dry_run:
+                for target in matched:
+                    delete(realm, user_id, target)
+            return matched
+
+        def content():
+            summary = {"users_total": len(users), "users_matched": 0, "deleted": 0, "errors": 0, "dry_run": dry_run}
+            for done, (user, matched) in enumerate(self._as_completed_map(cleanup, users), 1):
+                line = {"user_id": user["id"], "username": user.get("username"), "err": 0}
+                if isinstance(matched, Exception):
+                    summary["errors"] += 1
+                    line.update(err=1, err_desc=str(matched))
+                elif matched:
+                    summary["users_matched"] += 1
+                    summary["deleted"] += 0 if dry_run else len(matched)
+                    line["matched"] = matched
+                else:
+                    line = None
+                if line:
+                    yield fastjson.dumps(line) + "\n"
+                if done % 1000 == 0:
+                    self.logger.info("keycloak: credentials cleanup of realm %s: %d/%d users", realm, done, len(users))
+            yield fastjson.dumps({"summary": summary}) + "\n"
+
+        return StreamingHttpResponse(content(), content_type="application/x-ndjson")
+
+    def _defer_mutation(self, request, realm, user_id, op, target="", data=None):
+        if data is not None and not isinstance(data, dict):
+            raise APIError("un objet JSON est attendu", http_status=400)
+        mutation = self.enqueue_mutation(realm, user_id, op, target, data)
+        return {"data": mutation.get_status(request)}
+
+    def enqueue_mutation(self, realm, user_id, op, target="", data=None):
+        """
+        Ajoute une modification à la file ; elle est fusionnée avec les
+        modifications en attente du même utilisateur quand c'est possible et
+        la modification (éventuellement existante) est retournée.
+        """
+        with transaction.atomic():
+            pending = list(
+                self.mutations.select_for_update()
+                .filter(realm=realm, user_id=user_id, status="pending")
+                .order_by("pk")
+            )
+            existing, superseded = mutations.coalesce(
+                [(mutation.pk, mutation.op, mutation.target) for mutation in pending], op, target
+            )
+            if superseded:
+                self.mutations.filter(pk__in=superseded).update(status="superseded", completed=now())
+            if existing:
+                previous = next(mutation for mutation in pending if mutation.pk == existing)
+                if op == "update":
+                    previous.data = mutations.merge_update(previous.data, data or {})
+                    previous.save(update_fields=["data"])
+                return previous
+            mutation = PendingMutation.objects.create(
+                resource=self, realm=realm, user_id=user_id, op=op, target=target or "", data=data or {}
+            )
+        # une seule tâche programmée pour une rafale de modifications
+        if cache.add(f"passerelle-imio-keycloak-{self.pk}-mutations-scheduled", True, 30):
+            self.add_job("apply_mutations")
+        return mutation
+
+    def apply_mutations(self):
+        """
+        Applique les modifications en attente par lots ; celles d'un même
+        utilisateur sont appliquées dans l'ordre, les utilisateurs en parallèle.
+        """
+        # les modifications ajoutées à partir d'ici programment une nouvelle tâche
+        cache.delete(f"passerelle-imio-keycloak-{self.pk}-mutations-scheduled")
+        lock_key = f"passerelle-imio-keycloak-{self.pk}-mutations-lock"
+        if not cache.add(lock_key, True, 3600):
+            # déjà en cours dans un autre worker
+            return
+        try:
+            # interrompues par l'arrêt d'un worker précédent
+            self.mutations.filter(status="running").update(status="pending")
+            while True:
+                # une modification attend qu'une précédente modification du même
+                # utilisateur, en attente d'une nouvelle tentative, soit appliquée
+                retried_before = PendingMutation.objects.filter(
+                    resource=self,
+                    realm=models.OuterRef("realm"),
+                    user_id=models.OuterRef("user_id"),
+                    pk__lt=models.OuterRef("pk"),
+                    status="pending",
+                    not_before__gt=now(),
+                )
+                with transaction.atomic():
+                    batch = list(
+                        self.mutations.select_for_update()
+                        .filter(~models.Exists(retried_before), status="pending", not_before__lte=now())
+                        .order_by("pk")[:self.MUTATION_BATCH_SIZE]
+                    )
+                    self.mutations.filter(pk__in=[mutation.pk for mutation in batch]).update(status="running")
+                if not batch:
+                    break
+                queues = {}
+                for mutation in batch:
+                    queues.setdefault((mutation.realm, mutation.user_id), []).append(mutation)
+                self._parallel_map(self._apply_mutation_queue, queues.values())
+        finally:
+            cache.delete(lock_key)
+
+    def _apply_mutation_queue(self, mutations):
+        for index, mutation in enumerate(mutations):
+            mutation.attempts += 1
+            failed = retry = False
+            try:
+                self._apply_user_operation(mutation.realm, mutation.as_operation())
+                mutation.error = ""
+            except ValueError as e:
+                # modification invalide : la retenter ne changerait rien
+                failed = True
+                mutation.error = str(e)
+            except requests.RequestException as e:
+                # Keycloak injoignable, surchargé ou en erreur : nouvelle tentative
+                failed = True
+                mutation.error = str(e)
+                status = e.response.status_code if e.response is not None else None
+                retry = status is None or status == 429 or status >= 500
+            if retry and mutation.attempts < self.MUTATION_MAX_ATTEMPTS:
+                # nouvelle tentative plus tard, avec les modifications suivantes
+                # de l'utilisateur pour en conserver l'ordre
+                delay = self.MUTATION_RETRY_DELAY * 2 ** (mutation.attempts - 1)
+                mutation.status = "pending"
+                mutation.not_before = now() + datetime.timedelta(seconds=delay)
+                mutation.save()
+                PendingMutation.objects.filter(pk__in=[m.pk for m in mutations[index + 1:]]).update(
+                    status="pending", not_before=mutation.not_before
+                )
+                return
+            mutation.status = "failed" if failed else "completed"
+            mutation.completed = now()
+            mutation.save()
+
+    @endpoint(
+        methods=["get"],
+        name="mutation-status",
+        perm="can_access",
+        description="État d'une modification différée",
+        long_description="État d'une modification demandée avec mode=async (pending, running, completed, failed, superseded)",
+        display_order=11,
+        display_category="User",
+        parameters={
+            "id": {
+                "description": "Identifiant de la modification",
+                "example_value": "0f6a4b2e-7a51-4b5c-9f0a-3c1f2d9e8b7a",
+            }
+        }
+    )
+    @instrumented
+    def mutation_status(self, request, id):
+        try:
+            mutation = self.mutations.get(uuid=id)
+        except (PendingMutation.DoesNotExist, ValidationError):
+            raise APIError("modification inconnue", http_status=404)
+        return {"data": mutation.get_status(request)}
+
+    def daily(self):
+        super().daily()
+        self.aggregated_versions.filter(
+            created__lt=now() - datetime.timedelta(days=self.AGGREGATED_VERSIONS_RETENTION_DAYS)
+        ).delete()
+        self.mutations.filter(
+            status__in=["completed", "failed", "superseded"],
+            created__lt=now() - datetime.timedelta(days=self.MUTATION_RETENTION_DAYS),
+        ).delete()
+        for export in self.exports.filter(created__lt=now() - datetime.timedelta(days=self.EXPORT_RETENTION_DAYS)):
+            export.content.delete(save=False)
+            export.delete()
+
+    def _match_user(self, user, enabled=None, search=None, email_domain=None):
+        if enabled is not None and bool(user.get("enabled")) != enabled:
+            return False
+        email = (user.get("email") or "").lower()
+        if email_domain and not email.endswith(f"@{email_domain}"):
+            return False
+        if search:
+            search = search.lower()
+            values = (user.get("username"), user.get("email"), user.get("firstName"), user.get("lastName"))
+            if not any(search in (value or "").lower() for value in values):
+                return False
+        return True
+
+    def _subtree_members(self, realm, groups):
+        # membres connus du cache, les autres groupes sont interrogés
+        members = self.cached_snapshot(realm, "members") or {}
+        missing = [g for g in groups if g.get("id") and g["id"] not in members]
+        if missing:
+            members = dict(members, **self._fetch_snapshot(realm, "members", groups=missing))
+        return {g["id"]: members[g["id"]] for g in groups if g.get("id")}
+
+    def _fetch_members_with_users(self, realm, groups):
+        group_ids = [g["id"] for g in groups if g.get("id")]
+
+        def get_members(group_id):
+            return list(self._iter_pages(f"admin/realms/{realm}/groups/{group_id}/members"))
+
+        members = {}
+        users = {}
+        for group_id, group_members in zip(group_ids, self._parallel_map(get_members, group_ids)):
+            members[group_id] = [m["id"] for m in group_members if m.get("id")]
+            users.update((m["id"], m) for m in group_members if m.get("id"))
+        return members, list(users.values())
+
+
+class KeycloakRealm(models.Model):
+    resource = models.ForeignKey(KeycloakConnector, on_delete=models.CASCADE, related_name="realms")
+    name = models.CharField(max_length=256)
+    users_synced_at = models.DateTimeField(null=True)
+    # horodatage (ms) à partir duquel lire les événements d'administration
+    events_cursor = models.BigIntegerField(null=True)
+
+    class Meta:
+        unique_together = ("resource", "name")
+
+
+class KeycloakUser(models.Model):
+    """
+    Copie locale d'un utilisateur Keycloak, indexée pour les recherches
+    par adresse mail ou nom d'utilisateur.
+    """
+
+    realm = models.ForeignKey(KeycloakRealm, on_delete=models.CASCADE, related_name="users")
+    user_id = models.CharField(max_length=64)
+    username = models.CharField(max_length=256)
+    email = models.CharField(max_length=256, blank=True)
+    # username, email, prénom et nom en minuscules sans accents
+    search_text = models.TextField(blank=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ("realm", "user_id")
+        indexes = [
+            models.Index(fields=["realm", "email"], name="keycloak_user_email_idx"),
+            models.Index(fields=["realm", "username"], name="keycloak_user_username_idx"),
+            # recherche de sous-chaînes (LIKE '%mot%') de users-datasource
+            GinIndex(fields=["search_text"], name="keycloak_user_search_trgm", opclasses=["gin_trgm_ops"]),
+        ]
+
+    def set_fields(self):
+        # Keycloak stocke email et username en minuscules
+        self.username = (self.data.get("username") or "").lower()
+        self.email = (self.data.get("email") or "").lower()
+        self.search_text = user_search_text(self.data)
+        return self
+
+
+class RealmExport(models.Model):
+    """
+    Export en tâche de fond de realm-users-groups-aggregated, conservé
+    compressé (gzip) jusqu'à son téléchargement.
+    """
+
+    FORMATS = {
+        "json": ("application/json", "json"),
+        "ndjson": ("application/x-ndjson", "ndjson"),
+        "csv": ("text/csv", "csv"),
+    }
+    STATUSES = [
+        ("pending", "En attente"),
+        ("running", "En cours"),
+        ("completed", "Terminé"),
+        ("failed", "En erreur"),
+    ]
+    SPOOL_SIZE = 4 * 2**20
+
+    resource = models.ForeignKey(KeycloakConnector, on_delete=models.CASCADE, related_name="exports")
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    realm = models.CharField(max_length=256)
+    params = models.JSONField(default=dict)
+    format = models.CharField(max_length=8, choices=[(key, key) for key in FORMATS], default="json")
+    status = models.CharField(max_length=16, choices=STATUSES, default="pending")
+    progress = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    content = models.FileField(upload_to="passerelle_imio_keycloak/exports", null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(null=True)
+
+    def get_status(self, request):
+        status = {
+            "id": str(self.uuid),
+            "realm": self.realm,
+            "format": self.format,
+            "status": self.status,
+            "progress": self.progress,
+            "created": self.created,
+            "completed": self.completed,
+        }
+        if self.error:
+            status["error"] = self.error
+        kwargs = {"connector": self.resource.get_connector_slug(), "slug": self.resource.slug}
+        status["status_url"] = request.build_absolute_uri(
+            reverse("generic-endpoint", kwargs=dict(kwargs, endpoint="export-status"))
+        ) + f"?id={self.uuid}"
+        if self.status == "completed":
+            status["download_url"] = request.build_absolute_uri(
+                reverse("generic-endpoint", kwargs=dict(kwargs, endpoint="export-download"))
+            ) + f"?id={self.uuid}"
+        return status
+
+    def write(self, result):
+        # au-delà de SPOOL_SIZE l'export compressé est écrit sur disque, la
+        # mémoire utilisée ne croît pas avec la taille du realm
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as fd:
+            text = io.TextIOWrapper(fd, encoding="utf-8", newline="")
+            if self.format == "json":
+                text.write('{"data": [')
+                for i, user in enumerate(result["data"]):
+                    text.write(("," if i else "") + fastjson.dumps(user))
+                text.write('], "meta": ' + fastjson.dumps(result["meta"]) + "}")
+            elif self.format == "ndjson":
+                for user in result["data"]:
+                    text.write(fastjson.dumps(user) + "\n")
+            else:
+                users = iter(result["data"])
+                first = next(users, None)
+                writer = csv.DictWriter(text, fieldnames=list(first or []))
+                writer.writeheader()
+                for user in itertools.chain([first], users) if first else []:
+                    if "groups" in user:
+                        user = dict(user, groups="|".join(g["path"] or g["name"] or "" for g in user["groups"]))
+                    writer.writerow(user)
+            text.flush()
+            text.detach()
+        buffer.seek(0)
+        try:
+            self.content.save(f"{self.uuid}.{self.FORMATS[self.format][1]}.gz", File(buffer), save=False)
+        finally:
+            buffer.close()
+        self.save(update_fields=["content"])
+
+
+class PendingMutation(models.Model):
+    """
+    Modification différée (mode=async des endpoints d'écriture), appliquée
+    par la tâche apply_mutations.
+    """
+
+    STATUSES = [
+        ("pending", "En attente"),
+        ("running", "En cours"),
+        ("completed", "Terminé"),
+        ("failed", "En erreur"),
+        ("superseded", "Remplacé"),
+    ]
+    # paramètre de l'opération (voir bulk-users) porté par target
+    TARGETS = {
+        "add-group": "group_id",
+        "remove-group": "group_id",
+        "add-idp-link": "provider_id",
+        "remove-idp-link": "provider_id",
+        "remove-credential": "credential_id",
+    }
+
+    resource = models.ForeignKey(KeycloakConnector, on_delete=models.CASCADE, related_name="mutations")
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    realm = models.CharField(max_length=256)
+    user_id = models.CharField(max_length=64)
+    op = models.CharField(max_length=32)
+    target = models.CharField(max_length=256, blank=True)
+    data = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUSES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    not_before = models.DateTimeField(default=now)
+    completed = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["resource", "status", "not_before"], name="keycloak_mutation_queue_idx"),
+            models.Index(fields=["resource", "realm", "user_id"], name="keycloak_mutation_user_idx"),
+        ]
+
+    def as_operation(self):
+        operation = {"op": self.op, "user_id": self.user_id, "data": self.data}
+        if self.op in self.TARGETS:
+            operation[self.TARGETS[self.op]] = self.target
+        return operation
+
+    def get_status(self, request):
+        status = {
+            "id": str(self.uuid),
+            "realm": self.realm,
+            "user_id": self.user_id,
+            "op": self.op,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created": self.created,
+            "completed": self.completed,
+        }
+        if self.error:
+            status["error"] = self.error
+        kwargs = {"connector": self.resource.get_connector_slug(), "slug": self.resource.slug}
+        status["status_url"] = request.build_absolute_uri(
+            reverse("generic-endpoint", kwargs=dict(kwargs, endpoint="mutation-status"))
+        ) + f"?id={self.uuid}"
+        return status
+
+
+class AggregatedVersion(models.Model):
+    """
+    Empreintes des utilisateurs d'une réponse de realm-users-groups-aggregated
+    (mêmes realm et filtres), pour retourner les différences depuis cette
+    version (paramètre since).
+    """
+
+    resource = models.ForeignKey(KeycloakConnector, on_delete=models.CASCADE, related_name="aggregated_versions")
+    realm = models.CharField(max_length=256)
+    params_key = models.TextField()
+    version = models.CharField(max_length=32)
+    # GUID de l'utilisateur -> empreinte
+    digests = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["resource", "realm", "version"], name="keycloak_aggregated_version_idx"),
+        ]
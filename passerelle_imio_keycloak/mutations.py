@@ -0,0 +1,50 @@
+"""
+Règles de fusion des modifications différées (mode=async) d'un même
+utilisateur, indépendantes du stockage de la file.
+"""
+
+GROUP_OPS = ("add-group", "remove-group")
+
+
+def merge_update(data, changes):
+    """
+    Mise à jour partielle combinée avec une mise à jour en attente : comme
+    _update_user, une valeur None laisse le champ inchangé, elle n'efface pas
+    la valeur demandée précédemment.
+    """
+    merged = dict(data)
+    merged.update((key, value) for key, value in changes.items() if value is not None)
+    return merged
+
+
+def coalesce(pending, op, target=""):
+    """
+    pending : modifications en attente de l'utilisateur, (id, op, target) dans
+    l'ordre de la file. Retourne (existing, superseded) : l'id de la
+    modification en attente qui tient lieu de la nouvelle (None s'il faut
+    l'ajouter ; pour update, celle dans laquelle fusionner les données) et les
+    ids des modifications en attente devenues inutiles.
+    """
+    target = target or ""
+    superseded = []
+    if op == "update":
+        # les mises à jour partielles sont combinées
+        for pk, pending_op, _ in pending:
+            if pending_op == "update":
+                return pk, superseded
+        return None, superseded
+    if op == "delete":
+        # la suppression rend inutiles les autres modifications de l'utilisateur
+        superseded = [pk for pk, pending_op, _ in pending if pending_op != "delete"]
+    elif op in GROUP_OPS:
+        # seule la dernière demande pour un groupe compte
+        superseded = [
+            pk for pk, pending_op, pending_target in pending
+            if pending_op in GROUP_OPS and pending_op != op and pending_target == target
+        ]
+    if op != "add-idp-link":
+        # demande identique déjà en attente (les liens IdP portent des données)
+        for pk, pending_op, pending_target in pending:
+            if pending_op == op and pending_target == target and pk not in superseded:
+                return pk, superseded
+    return None, superseded
@@ -0,0 +1,121 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# champs d'un utilisateur Keycloak sur lesquels portent les recherches
+USER_SEARCH_FIELDS = ("username", "email", "firstName", "lastName")
+
+
+def normalize_search(text):
+    """Minuscules sans accents : « Émile » -> « emile »"""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def user_search_text(user):
+    return " ".join(normalize_search(user.get(field)) for field in USER_SEARCH_FIELDS if user.get(field))
+
+
+class ResponseCache:
+    """
+    Cache LRU en mémoire, borné en nombre d'entrées, avec une durée de vie
+    par entrée. Les clés commencent par le realm afin de pouvoir invalider
+    toutes les réponses d'un realm.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, stale=False):
+        """
+        Les entrées expirées restent en cache jusqu'à leur éviction et sont
+        retournées si stale (Keycloak indisponible).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[0] < time.monotonic() and not stale):
+                self.misses += 1
+                return self.MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, realm):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == realm]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Regroupe les appels simultanés d'une même fonction (même clé) dans le
+    processus : seul le premier l'exécute, les suivants attendent et
+    reçoivent son résultat (ou son exception).
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, func):
+        """Retourne (résultat, partagé)"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.flights), "shared": self.shared}
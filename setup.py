@@ -8,7 +8,7 @@ setup(
     version=version,
     author="iMio",
     author_email="support-ts@imio.be",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     include_package_data=True,
     classifiers=[
         "Environment :: Web Environment",
@@ -0,0 +1,22 @@
+"""
+Tests unitaires des modules indépendants de passerelle et de la base de
+données ; le cache Django est un cache local en mémoire.
+"""
+import django
+import pytest
+from django.conf import settings
+
+
+def pytest_configure():
+    if not settings.configured:
+        settings.configure(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+        django.setup()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
+    cache.clear()
@@ -0,0 +1,39 @@
+from passerelle_imio_keycloak import aggregation
+from passerelle_imio_keycloak.groups import GroupTree
+
+
+def test_iter_aggregated_joins_groups():
+    tree = GroupTree([{"id": "g1", "name": "G1"}])
+    tree.set_members({"g1": ["u1"]})
+    records = aggregation.compact_users(
+        [{"id": "u1", "username": "a"}, {"id": "u2", "username": "b"}, {"username": "no-id"}],
+        ["username", "groups"],
+    )
+    users = list(aggregation.iter_aggregated(records, ["username", "groups"], tree))
+    assert users == [
+        {"username": "a", "groups": [{"id": "g1", "name": "G1", "path": "/G1"}]},
+        {"username": "b", "groups": []},
+    ]
+
+
+def test_version_depends_on_filters_and_digests():
+    digests = {"u1": "aa", "u2": "bb"}
+    assert aggregation.version("filters", digests) == aggregation.version("filters", dict(reversed(digests.items())))
+    assert aggregation.version("filters", digests) != aggregation.version("other", digests)
+    assert aggregation.version("filters", digests) != aggregation.version("filters", {"u1": "aa", "u2": "cc"})
+
+
+def test_user_digest_changes_with_groups():
+    user = {"id": "u1", "groups": []}
+    assert aggregation.user_digest(user) != aggregation.user_digest(dict(user, groups=[{"id": "g1"}]))
+
+
+def test_delta():
+    users = [{"id": "u1"}, {"id": "u2"}, {"id": "u4"}]
+    previous = {"u1": "aa", "u2": "bb", "u3": "cc"}
+    digests = {"u1": "aa", "u2": "changed", "u4": "dd"}
+    assert aggregation.delta(previous, digests, users) == {
+        "added": [{"id": "u4"}],
+        "changed": [{"id": "u2"}],
+        "removed": ["u3"],
+    }
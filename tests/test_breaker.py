@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from django.core.cache import cache
+
+from passerelle_imio_keycloak.breaker import CircuitBreaker, RateLimiter, UpstreamUnavailable
+
+
+def breaker(**kwargs):
+    options = {"window": 60, "min_calls": 4, "failure_ratio": 0.5, "slow_call": 10, "open_seconds": 30}
+    options.update(kwargs)
+    return CircuitBreaker("test-breaker", **options)
+
+
+def test_breaker_stays_closed_below_min_calls():
+    b = breaker()
+    for _ in range(3):
+        b.after_call(True)
+    assert b.state() == CircuitBreaker.CLOSED
+    assert b.error_ratio() == 0
+    assert b.before_call() is False
+
+
+def test_breaker_opens_on_failure_ratio():
+    b = breaker()
+    b.after_call(False)
+    b.after_call(False)
+    b.after_call(True)
+    assert b.state() == CircuitBreaker.CLOSED
+    b.after_call(True)
+    assert b.state() == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable):
+        b.before_call()
+
+
+def test_breaker_half_open_single_probe():
+    b = breaker()
+    b.trip()
+    # fin de l'ouverture : seul l'indicateur semi-ouvert reste
+    cache.delete("test-breaker-open")
+    assert b.state() == CircuitBreaker.HALF_OPEN
+    assert b.before_call() is True
+    with pytest.raises(UpstreamUnavailable):
+        b.before_call()
+    # succès de l'appel d'essai : disjoncteur refermé
+    b.after_call(False, probe=True)
+    assert b.state() == CircuitBreaker.CLOSED
+
+
+def test_breaker_failed_probe_reopens():
+    b = breaker()
+    b.trip()
+    cache.delete("test-breaker-open")
+    assert b.before_call() is True
+    b.after_call(True, probe=True)
+    assert b.state() == CircuitBreaker.OPEN
+
+
+def test_breaker_probe_does_not_count_in_window():
+    b = breaker()
+    b.trip()
+    cache.delete("test-breaker-open")
+    b.before_call()
+    b.after_call(False, probe=True)
+    assert b.counters() == (0, 0)
+
+
+def test_rate_limiter_disabled():
+    limiter = RateLimiter("test-limiter", 0)
+    for _ in range(100):
+        limiter.acquire(timeout=0)
+
+
+def test_rate_limiter_rejects_over_rate(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1000.5)
+    limiter = RateLimiter("test-limiter", 3)
+    for _ in range(3):
+        limiter.acquire(timeout=0)
+    with pytest.raises(UpstreamUnavailable):
+        limiter.acquire(timeout=0)
+
+
+def test_rate_limiter_reduced_by_error_ratio(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 2000.5)
+    limiter = RateLimiter("test-limiter", 4)
+    limiter.acquire(timeout=0, error_ratio=0.5)
+    limiter.acquire(timeout=0, error_ratio=0.5)
+    with pytest.raises(UpstreamUnavailable):
+        limiter.acquire(timeout=0, error_ratio=0.5)
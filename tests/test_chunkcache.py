@@ -0,0 +1,42 @@
+from django.core.cache import cache
+
+from passerelle_imio_keycloak import chunkcache
+
+
+def test_roundtrip_over_several_chunks(monkeypatch):
+    monkeypatch.setattr(chunkcache, "CHUNK_SIZE", 100)
+    users = [{"id": f"user-{i}", "username": f"u{i}" * 5} for i in range(500)]
+    assert chunkcache.set_value("snapshot", users, 60, timestamp=1, fetched=2)
+    head = chunkcache.get_head("snapshot")
+    assert head["chunks"] > 1
+    assert (head["timestamp"], head["fetched"]) == (1, 2)
+    assert chunkcache.get_value("snapshot", head) == users
+
+
+def test_missing_chunk_is_a_miss(monkeypatch):
+    monkeypatch.setattr(chunkcache, "CHUNK_SIZE", 100)
+    chunkcache.set_value("snapshot", list(range(1000)), 60)
+    head = chunkcache.get_head("snapshot")
+    cache.delete(f"snapshot-{head['token']}-1")
+    assert chunkcache.get_value("snapshot") is None
+
+
+def test_old_format_head_is_ignored():
+    cache.set("snapshot", {"timestamp": 1, "data": []})
+    assert chunkcache.get_head("snapshot") is None
+    assert chunkcache.get_value("snapshot") is None
+
+
+def test_refused_value_drops_previous_one(monkeypatch):
+    chunkcache.set_value("snapshot", [1, 2, 3], 60)
+    monkeypatch.setattr(cache, "set_many", lambda data, timeout: list(data))
+    assert chunkcache.set_value("snapshot", [4, 5, 6], 60) is False
+    assert chunkcache.get_head("snapshot") is None
+
+
+def test_backend_error_is_not_raised(monkeypatch):
+    def set_many(data, timeout):
+        raise RuntimeError("object too large for cache")
+
+    monkeypatch.setattr(cache, "set_many", set_many)
+    assert chunkcache.set_value("snapshot", [1], 60) is False
@@ -0,0 +1,42 @@
+from passerelle_imio_keycloak.groups import GroupTree
+
+
+def tree():
+    return GroupTree([
+        {"id": "agents", "name": "Agents", "subGroups": [
+            {"id": "etat-civil", "name": "État civil"},
+            {"id": "travaux", "name": "Travaux", "subGroupCount": 1},
+        ]},
+        {"id": "elus", "name": "Élus"},
+    ], fetch_children=lambda group_id: [{"id": "voirie", "name": "Voirie"}] if group_id == "travaux" else [])
+
+
+def test_paths_and_fetched_children():
+    groups = tree()
+    assert len(groups) == 5
+    assert groups.get("/Agents/Travaux/Voirie")["id"] == "voirie"
+    assert groups.get("voirie")["path"] == "/Agents/Travaux/Voirie"
+
+
+def test_subtree():
+    assert [g["id"] for g in tree().subtree("/Agents/Travaux")] == ["travaux", "voirie"]
+    assert tree().subtree("unknown") == []
+
+
+def test_groups_of_direct_and_inherited():
+    groups = tree()
+    groups.set_members({"voirie": ["user"], "elus": ["user"]})
+    assert sorted(groups.groups_of("user")) == ["elus", "voirie"]
+    assert sorted(groups.groups_of("user", inherited=True)) == ["agents", "elus", "travaux", "voirie"]
+    assert groups.groups_of("other") == []
+
+
+def test_search_ignores_accents_and_case():
+    assert [g["id"] for g in tree().search("etat")] == ["etat-civil"]
+    assert [g["id"] for g in tree().search("agents voi")] == ["voirie"]
+
+
+def test_search_with_identical_paths():
+    # « / » dans un nom de groupe : deux groupes peuvent avoir le même chemin
+    groups = GroupTree([{"id": "a", "name": "same"}, {"id": "b", "name": "same"}])
+    assert sorted(g["id"] for g in groups.search("same")) == ["a", "b"]
@@ -0,0 +1,44 @@
+from passerelle_imio_keycloak.mutations import coalesce, merge_update
+
+
+def test_merge_update_keeps_earlier_value_for_none():
+    merged = merge_update({"email": "new@imio.be"}, {"email": None, "firstName": "Jo"})
+    assert merged == {"email": "new@imio.be", "firstName": "Jo"}
+
+
+def test_merge_update_last_value_wins():
+    assert merge_update({"email": "a@imio.be"}, {"email": "b@imio.be"}) == {"email": "b@imio.be"}
+
+
+def test_update_merges_into_pending_update():
+    pending = [(1, "add-group", "g1"), (2, "update", ""), (3, "update", "")]
+    assert coalesce(pending, "update") == (2, [])
+    assert coalesce([(1, "add-group", "g1")], "update") == (None, [])
+
+
+def test_delete_supersedes_other_mutations():
+    pending = [(1, "update", ""), (2, "add-group", "g1"), (3, "delete", "")]
+    assert coalesce(pending, "delete") == (3, [1, 2])
+    assert coalesce(pending[:2], "delete") == (None, [1, 2])
+
+
+def test_opposite_group_request_is_superseded():
+    pending = [(1, "add-group", "g1"), (2, "add-group", "g2")]
+    assert coalesce(pending, "remove-group", "g1") == (None, [1])
+
+
+def test_identical_request_is_reused():
+    pending = [(1, "add-group", "g1"), (2, "remove-credential", "c1")]
+    assert coalesce(pending, "add-group", "g1") == (1, [])
+    assert coalesce(pending, "remove-credential", "c1") == (2, [])
+    assert coalesce(pending, "remove-credential", "c2") == (None, [])
+
+
+def test_idp_links_are_never_merged():
+    pending = [(1, "add-idp-link", "itsme")]
+    assert coalesce(pending, "add-idp-link", "itsme") == (None, [])
+    assert coalesce([(1, "remove-idp-link", "itsme")], "remove-idp-link", "itsme") == (1, [])
+
+
+def test_missing_target_matches_empty_target():
+    assert coalesce([(1, "delete", "")], "delete", None) == (1, [])
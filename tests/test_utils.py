@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from passerelle_imio_keycloak.utils import ResponseCache, SingleFlight, normalize_search, user_search_text
+
+
+def test_normalize_search():
+    assert normalize_search("Émile Zoé") == "emile zoe"
+    assert normalize_search(None) == ""
+
+
+def test_user_search_text():
+    user = {"username": "EMODESTO", "email": "émile@imio.be", "firstName": "Émile", "lastName": None}
+    assert user_search_text(user) == "emodesto emile@imio.be emile"
+
+
+def test_response_cache_expiry_and_stale(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    responses = ResponseCache()
+    responses.set(("imio", "path", ()), "data", 10)
+    assert responses.get(("imio", "path", ())) == "data"
+    clock[0] += 11
+    assert responses.get(("imio", "path", ())) is ResponseCache.MISSING
+    # expirée mais conservée pour le cas où Keycloak est indisponible
+    assert responses.get(("imio", "path", ()), stale=True) == "data"
+
+
+def test_response_cache_lru_eviction():
+    responses = ResponseCache(max_entries=2)
+    responses.set(("imio", "a", ()), 1, 60)
+    responses.set(("imio", "b", ()), 2, 60)
+    responses.get(("imio", "a", ()))
+    responses.set(("imio", "c", ()), 3, 60)
+    assert responses.get(("imio", "b", ())) is ResponseCache.MISSING
+    assert responses.get(("imio", "a", ())) == 1
+    assert responses.stats()["evictions"] == 1
+
+
+def test_response_cache_invalidate_realm():
+    responses = ResponseCache()
+    responses.set(("imio", "a", ()), 1, 60)
+    responses.set(("liege", "a", ()), 2, 60)
+    responses.invalidate("imio")
+    assert responses.get(("imio", "a", ())) is ResponseCache.MISSING
+    assert responses.get(("liege", "a", ())) == 2
+
+
+def test_single_flight_shares_concurrent_calls():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("key", fetch))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["shared"] < 5:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 5
+    assert flights.stats() == {"in_flight": 0, "shared": 5}
+
+
+def test_single_flight_propagates_errors():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fail)
+    # la clé est libérée : l'appel suivant est exécuté
+    assert flights.do("key", lambda: 1) == (1, False)